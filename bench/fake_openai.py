@@ -0,0 +1,149 @@
+"""
+Stub OpenAI API for running the bot offline.
+
+Serves chat completions (plain and streamed) and speech with configurable
+latency, so the bot can be benchmarked without network or API costs:
+
+    python -m bench.fake_openai --port 8082 --latency 0.5 --token-delay 0.01
+
+    OPENAI_BASE_URL=http://127.0.0.1:8082/v1 OPENAI_API_KEY=bench python bot.py
+
+Answers are random Dutch sentences put together from canned parts, varied
+enough that the bot's duplicate check rarely rejects them; word translation
+prompts get answers in the format the translation handler parses.
+"""
+import argparse, asyncio, itertools, json, random, re, time
+from aiohttp import web
+
+SENTENCE_PARTS = [
+    ["Mijn buurman", "De lerares", "Onze kinderen", "Mijn zus", "De bakker", "Een oude man",
+     "Mijn collega", "De studenten", "Tante Els", "De postbode", "Het meisje", "Mijn opa"],
+    ["koopt", "zoekt", "vergeet", "brengt", "schildert", "verkoopt",
+     "leent", "repareert", "verstopt", "bestelt", "tekent", "wast"],
+    ["een rode fiets", "twee boeken", "de sleutels", "een warme jas", "het oude kastje", "een taart",
+     "drie kaartjes", "de groene vaas", "een nieuwe laptop", "het pakje", "een kleine hond", "de brieven"],
+    ["in Utrecht", "na het werk", "op zaterdag", "bij de markt", "voor het station", "in de zomer",
+     "om acht uur", "tijdens de pauze", "naast de kerk", "in het park", "op het strand", "na de les"],
+]
+
+QUOTED_WORD = re.compile(r"'([^']+)'")
+
+
+class FakeOpenAI:
+    """
+    Minimal OpenAI server. `latency` is the delay before the first byte of
+    an answer, `token_delay` the delay between streamed chunks, and
+    `error_rate` the share of requests answered with a 500.
+    """
+
+    def __init__(self, latency=0.5, token_delay=0.01, tts_latency=1.0, audio_bytes=16384, error_rate=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tts_latency = tts_latency
+        self.audio = {
+            "mp3": (b"\xff\xf3" + bytes(max(audio_bytes - 2, 0)), "audio/mpeg"),  # MP3 frame header, then silence
+            "opus": (b"OggS" + bytes(max(audio_bytes // 2 - 4, 0)), "audio/ogg"),  # Ogg page header; opus is smaller
+        }
+        self.error_rate = error_rate
+        self.counter = itertools.count(1)
+        self.calls = {}
+        self.web_app = web.Application()
+        self.web_app.router.add_post("/v1/chat/completions", self.handle_chat)
+        self.web_app.router.add_post("/v1/audio/speech", self.handle_speech)
+
+    def count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def failed(self):
+        if self.error_rate and random.random() < self.error_rate:
+            self.count("errors")
+            return web.json_response({"error": {"message": "stub failure", "type": "server_error"}}, status=500)
+        return None
+
+    def answer(self, prompt):
+        if "use format:" in prompt:
+            words = QUOTED_WORD.findall(prompt.split("use format:")[0])
+            return ", ".join(f"'{w}' - {w}-en" for w in words)
+        return "\n".join(" ".join(random.choice(part) for part in SENTENCE_PARTS) + "." for _ in range(2))
+
+    async def handle_chat(self, request):
+        self.count("chat")
+        body = await request.json()
+        await asyncio.sleep(self.latency)
+        error = self.failed()
+        if error:
+            return error
+
+        prompt = body["messages"][-1]["content"]
+        content = self.answer(prompt)
+        model = body.get("model", "gpt-4o")
+        usage = {
+            "prompt_tokens": sum(len(m["content"].split()) for m in body["messages"]),
+            "completion_tokens": len(content.split()),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"chatcmpl-{next(self.counter)}", "created": int(time.time()), "model": model}
+
+        if not body.get("stream"):
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(data):
+            await response.write(f"data: {json.dumps(data)}\n\n".encode())
+
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for word in re.findall(r"\S+\s*", content):
+            await send({**chunk, "choices": [{"index": 0, "delta": {"content": word}}]})
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        await send({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send({**chunk, "choices": [], "usage": usage})
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def handle_speech(self, request):
+        self.count("speech")
+        body = await request.json()
+        await asyncio.sleep(self.tts_latency)
+        error = self.failed()
+        if error:
+            return error
+        audio, content_type = self.audio.get(body.get("response_format", "mp3"), self.audio["mp3"])
+        return web.Response(body=audio, content_type=content_type)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.fake_openai")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before an answer starts")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument("--tts-latency", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    args = parser.parse_args(argv)
+
+    api = FakeOpenAI(args.latency, args.token_delay, args.tts_latency, error_rate=args.error_rate)
+    runner = web.AppRunner(api.web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    print(f"Stub OpenAI API on http://127.0.0.1:{args.port}/v1")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,172 @@
+"""
+Fake Telegram for benchmarking the webhook mode offline.
+
+It serves a stub Bot API (answers getMe, sendMessage, sendAudio, ... with
+plausible results) and posts synthetic updates to the bot's webhook.
+
+    python -m bench.fake_telegram --updates 1000 --users 50 --text /start
+
+Start it first, then the bot pointed at it:
+
+    BOT_MODE=webhook TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot WEBHOOK_SECRET=bench \\
+        AUTHORIZED_USERS=1,2,...,50 python bot.py
+
+The harness waits for the bot's /readyz, fires the updates and reports how
+fast the webhook accepted them and how fast the bot's replies came back.
+"""
+import argparse, asyncio, itertools, json, statistics, time
+from aiohttp import ClientSession, web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+# Replies that mean a handler gave up
+ERROR_MARKERS = ("error occurred", "went wrong")
+
+
+class FakeBotAPI:
+    """Minimal Bot API server: every method succeeds and is counted."""
+
+    def __init__(self):
+        self.calls = {}
+        self.message_ids = itertools.count(1)
+        self.reply_times = []  # monotonic time of every message the bot sent
+        self.error_replies = 0
+        self.web_app = web.Application()
+        self.web_app.router.add_post("/bot{token}/{method}", self.handle)
+        self.web_app.router.add_get("/bot{token}/{method}", self.handle)
+
+    def message(self, chat_id, **extra):
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id or 0), "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = dict(await request.post()) if request.can_read_body else {}
+        if not params and request.content_type == "application/json":
+            params = await request.json()
+        chat_id = params.get("chat_id")
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method in ("sendMessage", "editMessageText"):
+            self.reply_times.append(time.monotonic())
+            text = str(params.get("text", ""))
+            if any(marker in text for marker in ERROR_MARKERS):
+                self.error_replies += 1
+            result = self.message(chat_id, text=text)
+        elif method in ("sendAudio", "sendVoice"):
+            self.reply_times.append(time.monotonic())
+            kind = "audio" if method == "sendAudio" else "voice"
+            file_id = f"fake-{kind}-{next(self.message_ids)}"
+            result = self.message(chat_id, **{kind: {"file_id": file_id, "file_unique_id": file_id, "duration": 1}})
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_update(update_id, user_id, text):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def wait_ready(session, url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+async def post_updates(session, url, secret, updates, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def post(update):
+        async with semaphore:
+            started = time.monotonic()
+            async with session.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as response:
+                response.raise_for_status()
+            latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*(post(update) for update in updates))
+    return latencies
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.fake_telegram")
+    parser.add_argument("--port", type=int, default=8081, help="port of the stub Bot API")
+    parser.add_argument("--bot", default="http://127.0.0.1:8080", help="base URL of the bot's webhook server")
+    parser.add_argument("--path", default="/telegram")
+    parser.add_argument("--secret", default="bench")
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--text", default="/start", help="text of every update")
+    parser.add_argument("--concurrency", type=int, default=50, help="updates posted in parallel")
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for replies")
+    args = parser.parse_args(argv)
+
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+    print(f"Stub Bot API on http://127.0.0.1:{args.port}/bot, waiting for {args.bot}/readyz ...")
+
+    try:
+        async with ClientSession() as session:
+            await wait_ready(session, args.bot + "/readyz")
+            updates = [make_update(i, i % args.users + 1, args.text) for i in range(1, args.updates + 1)]
+            replies_before = len(api.reply_times)
+            started = time.monotonic()
+            latencies = await post_updates(session, args.bot + args.path, args.secret, updates, args.concurrency)
+            posted = time.monotonic() - started
+
+            # Wait until every update got at least one reply, or the drain timeout
+            deadline = time.monotonic() + args.drain
+            while len(api.reply_times) - replies_before < len(updates) and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            replies = api.reply_times[replies_before:]
+            elapsed = (replies[-1] - started) if replies else None
+
+        report = {
+            "updates": len(updates),
+            "post_seconds": round(posted, 3),
+            "post_per_second": round(len(updates) / posted, 1),
+            "post_latency_p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "post_latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "replies": len(replies),
+            "replies_per_second": round(len(replies) / elapsed, 1) if elapsed else None,
+            "api_calls": api.calls,
+        }
+        print(json.dumps(report, indent=2))
+        return report
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
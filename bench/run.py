@@ -0,0 +1,303 @@
+"""
+Offline load test of the whole bot.
+
+Runs BotApp in-process against the stub Bot API (bench.fake_telegram) and the
+stub OpenAI API (bench.fake_openai), both served from a separate thread, and
+drives it with synthetic updates:
+
+    python -m bench.run                                  # every scenario
+    python -m bench.run dictate word --users 20 --rounds 5 --latency 0.2
+    python -m bench.run --baseline bench/results/<earlier run>.json
+
+Every simulated user sends an update, waits until the bot has handled it and
+sends the next one. Latency is measured from handing the update to the
+Application until its handler returns (the command's JSON trace line, see
+core.metrics). Results are printed and saved under bench/results/, named
+after the commit, so runs of different commits can be compared.
+"""
+import argparse, asyncio, itertools, json, logging, os, resource, statistics, subprocess, tempfile, threading, time
+from aiohttp import web
+from bench.fake_openai import FakeOpenAI
+from bench.fake_telegram import FakeBotAPI, make_update, percentile
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# name -> (update that puts the user in the right mode or None, text of update i, command to wait for)
+SCENARIOS = {
+    "start": (None, lambda i: "/start", "start"),
+    "dictate": (None, lambda i: "/dictate B1", "dictate"),
+    "translation": (None, lambda i: "/translation B1 L", "translation"),
+    "reading": (None, lambda i: "/reading B1", "reading"),
+    "word": (None, lambda i: f"/word woord{i}", "word"),
+    "explain": (None, lambda i: f"/explain Ik heb het boek gelezen ({i})", "explain"),
+    "stats": (None, lambda i: "/stats", "stats"),
+    "dictate_check": (("/dictate B1", "dictate"), lambda i: "Morgen gaan we met de trein naar Utrecht.", "dictate_check"),
+    "translation_check": (("/translation B1 L", "translation"), lambda i: "Ik ga morgen naar school.", "translation_check"),
+}
+
+
+def rss_mb():
+    """Current resident set size, or the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class StubServers(threading.Thread):
+    """Serves the stub APIs from their own event loop, so they don't compete with the bot's."""
+
+    def __init__(self, *web_apps):
+        super().__init__(daemon=True)
+        self.web_apps = web_apps
+        self.ports = []
+        self.runners = []
+        self.ready = threading.Event()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self._start())
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def _start(self):
+        for web_app in self.web_apps:
+            runner = web.AppRunner(web_app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            self.runners.append(runner)
+            self.ports.append(runner.addresses[0][1])
+
+    def stop(self):
+        async def cleanup():
+            for runner in self.runners:
+                await runner.cleanup()
+        asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+
+class TraceWaiter(logging.Handler):
+    """Resolves a waiting future when the trace line of a (user, command) is logged."""
+
+    def __init__(self):
+        super().__init__()
+        self.waiting = {}  # (user_id, command) -> future
+        self.events = []
+
+    def emit(self, record):
+        try:
+            event = json.loads(record.getMessage())
+        except ValueError:
+            return
+        self.events.append(event)
+        future = self.waiting.pop((event["user"], event["command"]), None)
+        if future and not future.done():
+            future.set_result(event)
+
+
+class Bench:
+    def __init__(self, bot, waiter, telegram, timeout):
+        self.bot = bot
+        self.waiter = waiter
+        self.telegram = telegram
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+
+    async def send(self, user_id, text, command):
+        """Sends one update and returns (seconds until handled, trace event)."""
+        from telegram import Update
+        future = asyncio.get_running_loop().create_future()
+        self.waiter.waiting[(user_id, command)] = future
+        update = Update.de_json(make_update(next(self.update_ids), user_id, text), self.bot.app.bot)
+        started = time.monotonic()
+        await self.bot.app.update_queue.put(update)
+        try:
+            event = await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.waiter.waiting.pop((user_id, command), None)
+        return time.monotonic() - started, event
+
+    async def scenario(self, name, users, rounds):
+        setup, text, command = SCENARIOS[name]
+        latencies, events = [], []
+        timeouts = 0
+        counter = itertools.count(1)
+
+        async def user(user_id):
+            nonlocal timeouts
+            for _ in range(rounds):
+                try:
+                    if setup:
+                        await self.send(user_id, *setup)
+                    seconds, event = await self.send(user_id, text(next(counter)), command)
+                except asyncio.TimeoutError:
+                    timeouts += 1
+                    continue
+                latencies.append(seconds)
+                events.append(event)
+
+        errors_before = self.telegram.error_replies
+        rss_before = rss_mb()
+        started = time.monotonic()
+        await asyncio.gather(*(user(user_id) for user_id in range(1, users + 1)))
+        elapsed = time.monotonic() - started
+
+        stages = {}
+        for event in events:
+            for stage, ms in event["stages_ms"].items():
+                stages.setdefault(stage, []).append(ms)
+
+        def ms(seconds):
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "requests": users * rounds,
+            "completed": len(latencies),
+            "timeouts": timeouts,
+            "error_replies": self.telegram.error_replies - errors_before,
+            "failed_handlers": sum(1 for e in events if e["outcome"] != "ok"),
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "mean_ms": ms(statistics.fmean(latencies)) if latencies else None,
+            "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "elapsed_s": round(elapsed, 2),
+            "stages_p50_ms": {stage: round(statistics.median(v), 1) for stage, v in sorted(stages.items())},
+            "rss_mb": round(rss_mb(), 1),
+            "rss_delta_mb": round(rss_mb() - rss_before, 1),
+        }
+
+
+def configure(args, data_dir, telegram_port, openai_port):
+    """Points config at the stubs and a throwaway data directory; must run before core is imported."""
+    os.environ.update({
+        "TELEGRAM_TOKEN": "1:bench",
+        "TELEGRAM_BASE_URL": f"http://127.0.0.1:{telegram_port}/bot",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "BOT_MODE": "webhook",  # no Updater: updates are put on the queue directly
+        "AUTHORIZED_USERS": ",".join(str(u) for u in range(1, args.users + 1)),
+        "RATE_LIMITS": "default:1000000/1",
+        "UPDATE_CONCURRENCY": str(args.concurrency),
+        "EXERCISE_POOL_SIZE": str(args.pool),
+        "MEMORY_DB": os.path.join(data_dir, "memory.db"),
+        "RESPONSE_CACHE_DB": os.path.join(data_dir, "cache.db"),
+        "CONTENT_DB": os.path.join(data_dir, "content.db"),
+        "PROGRESS_DIR": os.path.join(data_dir, "progress"),
+        "PERSISTENCE_DB": os.path.join(data_dir, "state.db"),
+        "AUDIO_CACHE_DIR": os.path.join(data_dir, "audio_cache"),
+    })
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline.get('commit')} ({os.path.basename(baseline_path)}):")
+    for name, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s"):
+            if old.get(key) and result.get(key) is not None:
+                changes.append(f"{key} {old[key]} -> {result[key]} ({(result[key] - old[key]) / old[key]:+.0%})")
+        print(f"  {name}: " + ", ".join(changes))
+
+
+async def run(args):
+    telegram = FakeBotAPI()
+    openai_api = FakeOpenAI(args.latency, args.token_delay, args.tts_latency, error_rate=args.error_rate)
+    stubs = StubServers(telegram.web_app, openai_api.web_app)
+    stubs.start()
+    stubs.ready.wait()
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as data_dir:
+        configure(args, data_dir, *stubs.ports)
+        from core.app import BotApp
+
+        # Keep the console quiet; the trace lines go to the waiter only
+        logging.getLogger().setLevel(logging.WARNING)
+        waiter = TraceWaiter()
+        trace_logger = logging.getLogger("core.metrics")
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+        trace_logger.addHandler(waiter)
+
+        bot = BotApp()
+        bench = Bench(bot, waiter, telegram, args.timeout)
+        scenarios = {}
+        try:
+            async with bot.app:
+                await bot.app.start()
+                for name in args.scenarios:
+                    calls_before = dict(openai_api.calls)
+                    result = await bench.scenario(name, args.users, args.rounds)
+                    result["openai_calls"] = {
+                        k: v - calls_before.get(k, 0) for k, v in openai_api.calls.items() if v - calls_before.get(k, 0)
+                    }
+                    scenarios[name] = result
+                    print(f"{name:>18}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                          f"p99 {result['p99_ms']} ms, {result['throughput_per_s']}/s, "
+                          f"{result['completed']}/{result['requests']} done, rss {result['rss_mb']} MB")
+                await bot.app.stop()
+        finally:
+            await bot.post_shutdown(bot.app)
+            stubs.stop()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {
+            key: getattr(args, key) for key in
+            ("users", "rounds", "concurrency", "pool", "latency", "token_delay", "tts_latency", "error_rate")
+        },
+        "scenarios": scenarios,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run")
+    parser.add_argument("scenarios", nargs="*", metavar="scenario",
+                        help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--users", type=int, default=10, help="simulated users, each with one update in flight")
+    parser.add_argument("--rounds", type=int, default=5, help="updates per user and scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="UPDATE_CONCURRENCY of the bot")
+    parser.add_argument("--pool", type=int, default=0, help="EXERCISE_POOL_SIZE of the bot")
+    parser.add_argument("--latency", type=float, default=0.3, help="stub OpenAI seconds before an answer")
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--tts-latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to wait for one update")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    parser.add_argument("--out", help="results file (default: bench/results/<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+    args.scenarios = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    report = asyncio.run(run(args))
+
+    path = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {path}")
+    if args.baseline:
+        compare(report, args.baseline)
+    return report
+
+
+if __name__ == "__main__":
+    main()
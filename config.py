@@ -5,15 +5,126 @@ if os.path.exists(".env"):
     load_dotenv()
 
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
+# Only set to point the bot at a local/fake Bot API server, e.g. http://127.0.0.1:8081/bot
+TELEGRAM_BASE_URL = os.environ.get("TELEGRAM_BASE_URL")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+# Only set to point the bot at a local/fake OpenAI server, e.g. http://127.0.0.1:8082/v1
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
 AUTHORIZED_USERS = [
     int(uid) for uid in os.environ.get("AUTHORIZED_USERS", "").split(",") if uid
 ]
 
+# "polling" (default) or "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+# Public URL Telegram should post updates to, e.g. https://example.up.railway.app/telegram
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram")
+# Secret Telegram sends with every update; a random one is generated when empty and WEBHOOK_URL is set
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+PORT = int(os.environ.get("PORT", "8080"))
+# Port of the /metrics endpoint in polling mode (0 = off); webhook mode serves it on PORT
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Number of updates processed at the same time (one user's updates always run one after another)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", "16"))
+# Updates accepted but not finished yet; beyond this polling pauses and the webhook answers 503
+UPDATE_MAX_PENDING = int(os.environ.get("UPDATE_MAX_PENDING", "256"))
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 MEMORY_FILE = os.path.join(DATA_DIR, "memory.json")
+MEMORY_DB = os.environ.get("MEMORY_DB", os.path.join(DATA_DIR, "memory.db"))
+# Redis URL (redis://host:6379/0) of the state shared by several bot processes; empty keeps everything in-process
+SHARED_STORE_URL = os.environ.get("SHARED_STORE_URL", "")
+# "sqlite", "json" for the legacy whole-file backend, or "shared" (the default with SHARED_STORE_URL)
+MEMORY_BACKEND = os.environ.get("MEMORY_BACKEND", "shared" if SHARED_STORE_URL else "sqlite")
+# Seconds between write-behind flushes of new sentences to storage
+MEMORY_FLUSH_INTERVAL = int(os.environ.get("MEMORY_FLUSH_INTERVAL", "30"))
+# Days of sentence history kept in RAM
+MEMORY_LOOKBACK_DAYS = int(os.environ.get("MEMORY_LOOKBACK_DAYS", "7"))
+# Earlier sentences quoted in a generation prompt (instead of the whole history)
+DEDUPE_SAMPLE_SIZE = int(os.environ.get("DEDUPE_SAMPLE_SIZE", "10"))
+# Estimated similarity (0-1) from which a generated sentence counts as a repeat
+DEDUPE_THRESHOLD = float(os.environ.get("DEDUPE_THRESHOLD", "0.6"))
+# Generations tried before a repeat is accepted anyway
+DEDUPE_ATTEMPTS = int(os.environ.get("DEDUPE_ATTEMPTS", "3"))
+# Sentences kept in the duplicate index per mode
+DEDUPE_MAX_ENTRIES = int(os.environ.get("DEDUPE_MAX_ENTRIES", "5000"))
+# Dictation answers with at most this many accent, spelling or word order slips, and nothing worse,
+# are checked locally, without an OpenAI call
+DICTATE_LOCAL_MAX_ERRORS = int(os.environ.get("DICTATE_LOCAL_MAX_ERRORS", "1"))
+# ...and only when they still score at least this much out of 10
+DICTATE_LOCAL_MIN_SCORE = float(os.environ.get("DICTATE_LOCAL_MIN_SCORE", "9"))
 WORDS_FILE = os.path.join(DATA_DIR, "frequent_words_2000_5000.csv")
+# Words remembered per user and excluded from /translation sampling (0 disables)
+WORDS_RECENT_EXCLUDE = int(os.environ.get("WORDS_RECENT_EXCLUDE", "60"))
+# Seconds between checks for an updated word list CSV
+WORDS_RELOAD_INTERVAL = int(os.environ.get("WORDS_RELOAD_INTERVAL", "300"))
+
+# Maximum number of OpenAI requests in flight at the same time (shared by all users)
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+# Read timeout in seconds for a single OpenAI request
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "60"))
+# Total seconds a chat call may take, retries included (TTS gets its own, longer deadline)
+OPENAI_DEADLINE = float(os.environ.get("OPENAI_DEADLINE", "45"))
+OPENAI_TTS_DEADLINE = float(os.environ.get("OPENAI_TTS_DEADLINE", "90"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "3"))
+# Backoff: a random delay up to base * 2^attempt, capped at max (seconds)
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "8"))
+# Cheaper model used when the requested one is failing (empty disables the fallback)
+OPENAI_FALLBACK_MODEL = os.environ.get("OPENAI_FALLBACK_MODEL", "gpt-4o-mini")
+# Consecutive failures that open a model's circuit breaker, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+# Per-user limits as command:count/seconds; "message" covers free-text answers, "default" everything else
+RATE_LIMITS = os.environ.get(
+    "RATE_LIMITS",
+    "reading:3/60,dictate:6/60,translation:6/60,word:10/60,explain:10/60,message:20/60,default:20/60",
+)
+
+# Minimum seconds between edits of a message while an answer is streamed in
+STREAM_EDIT_INTERVAL = float(os.environ.get("STREAM_EDIT_INTERVAL", "1.0"))
+
+# Ready-made exercises kept per bucket (0 disables the pool)
+EXERCISE_POOL_SIZE = int(os.environ.get("EXERCISE_POOL_SIZE", "2"))
+# Buckets to keep warm, as mode:level[:style]
+EXERCISE_POOL_BUCKETS = os.environ.get("EXERCISE_POOL_BUCKETS", "dictate:B1,translation:B1:L,reading:B1")
+# Seconds between background refill passes
+EXERCISE_POOL_INTERVAL = int(os.environ.get("EXERCISE_POOL_INTERVAL", "60"))
+
+# Saved context.user_data (exercises in progress), written in batches every PERSISTENCE_INTERVAL seconds
+PERSISTENCE_DB = os.environ.get("PERSISTENCE_DB", os.path.join(DATA_DIR, "state.db"))
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "30"))
+
+# Per-user progress (/stats), spread over this many SQLite files by user id;
+# fixed once progress is stored (the bot refuses to start with another count)
+PROGRESS_DIR = os.environ.get("PROGRESS_DIR", os.path.join(DATA_DIR, "progress"))
+PROGRESS_SHARDS = int(os.environ.get("PROGRESS_SHARDS", "8"))
+
+# Cached /word and /explain answers
+RESPONSE_CACHE_DB = os.environ.get("RESPONSE_CACHE_DB", os.path.join(DATA_DIR, "cache.db"))
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", str(30 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+# Content generated ahead of time by `python -m core.precompute`
+CONTENT_DB = os.environ.get("CONTENT_DB", os.path.join(DATA_DIR, "content.db"))
+
+TTS_MODEL = "gpt-4o-mini-tts"
+# "mp3" (sent as audio files) or "opus" (smaller, sent as voice notes that play inline)
+TTS_FORMAT = os.environ.get("TTS_FORMAT", "mp3")
+# Synthesized audio is kept in memory up to this size, then spooled to a temporary file
+TTS_SPOOL_MAX_BYTES = int(os.environ.get("TTS_SPOOL_MAX_BYTES", str(2 * 1024 * 1024)))
+# /reading audio: "single" (one TTS call, one file), "chunks" (groups of sentences synthesized in
+# parallel, each sent as its own message as soon as it and the ones before it are ready) or "joined"
+# (the same chunks as one file once all are ready; MP3 only, TTS_FORMAT=opus sends chunks)
+READING_TTS_MODE = os.environ.get("READING_TTS_MODE", "single")
+READING_TTS_CHUNK_WORDS = int(os.environ.get("READING_TTS_CHUNK_WORDS", "60"))
+# TTS calls in flight per /reading
+READING_TTS_CONCURRENCY = int(os.environ.get("READING_TTS_CONCURRENCY", "3"))
+AUDIO_CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", os.path.join(DATA_DIR, "audio_cache"))
+# Disk budget for cached audio files (0: audio only lives in memory; uploads are reused by file_id either way)
+AUDIO_CACHE_MAX_MB = int(os.environ.get("AUDIO_CACHE_MAX_MB", "0"))
 
 VOICES = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
 VALID_LEVELS = ['A1', 'A2', 'B1', 'B2', 'C1', 'C2']
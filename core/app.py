@@ -1,43 +1,245 @@
+import asyncio, logging, secrets, signal
+from telegram import Update
 from telegram.ext import Application
-from config import TELEGRAM_TOKEN, MEMORY_FILE
+from config import (
+    TELEGRAM_TOKEN, TELEGRAM_BASE_URL, BOT_MODE, UPDATE_CONCURRENCY, UPDATE_MAX_PENDING,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, PORT, METRICS_PORT,
+    MEMORY_FILE, MEMORY_DB, MEMORY_BACKEND,
+    MEMORY_FLUSH_INTERVAL, MEMORY_LOOKBACK_DAYS,
+    WORDS_FILE, WORDS_RECENT_EXCLUDE, WORDS_RELOAD_INTERVAL,
+    DEDUPE_SAMPLE_SIZE, DEDUPE_THRESHOLD, DEDUPE_MAX_ENTRIES,
+    EXERCISE_POOL_SIZE, EXERCISE_POOL_BUCKETS, EXERCISE_POOL_INTERVAL,
+    AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB,
+    RATE_LIMITS, OPENAI_MAX_CONCURRENCY,
+    RESPONSE_CACHE_DB, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, CONTENT_DB,
+    PROGRESS_DIR, PROGRESS_SHARDS, PERSISTENCE_DB, PERSISTENCE_INTERVAL, SHARED_STORE_URL,
+)
 from core.openai_client import OpenAIClient
+from core.audio_cache import AudioCache
+from core.response_cache import ResponseCache
+from core.content_store import ContentStore
+from core.glossary import Glossary
+from core.progress import ProgressStore
+from core.persistence import SQLitePersistence, StorePersistence
+from core.shared_store import create_shared_store
 from core.memory import MemoryManager
+from core.memory_cache import CachedMemoryManager
+from core.dedupe import Deduper
+from core.storage import create_storage
+from core.word_bank import WordBank
+from core.exercise_pool import ExercisePool, parse_buckets
+from core.router import ModeRouter
+from core.rate_limit import FairScheduler, RateLimiter, parse_limits
+from core.webhook import WebhookServer
+from core.update_processor import UserOrderedUpdateProcessor, UpdateQueue
+from core.metrics import REGISTRY, MetricsServer
+from core.handlers.gate_handler import GateHandler
 from core.handlers.start_handler import StartHandler
 from core.handlers.translation_handler import TranslationHandler
 from core.handlers.dictate_handler import DictateHandler
 from core.handlers.reading_handler import ReadingHandler
 from core.handlers.word_handler import WordHandler
 from core.handlers.explain_handler import ExplainHandler
+from core.handlers.stats_handler import StatsHandler
+
+logger = logging.getLogger(__name__)
 
 class BotApp:
     def __init__(self):
-        self.app = Application.builder().token(TELEGRAM_TOKEN).build()
-        self.memory = MemoryManager(MEMORY_FILE)
-        self.openai = OpenAIClient()
+        # State that several bot processes must see alike lives here when SHARED_STORE_URL is set
+        self.store = create_shared_store(SHARED_STORE_URL)
+        shared_store = self.store if self.store.shared else None
+        if shared_store:
+            self.persistence = StorePersistence(self.store, update_interval=PERSISTENCE_INTERVAL)
+        else:
+            self.persistence = SQLitePersistence(PERSISTENCE_DB, update_interval=PERSISTENCE_INTERVAL)
+        self.update_processor = UserOrderedUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING, self.store)
+        builder = (
+            Application.builder()
+            .token(TELEGRAM_TOKEN)
+            .concurrent_updates(self.update_processor)
+            .update_queue(UpdateQueue(self.update_processor))
+            .persistence(self.persistence)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+        )
+        if TELEGRAM_BASE_URL:
+            builder = builder.base_url(TELEGRAM_BASE_URL)
+        if BOT_MODE == "webhook":
+            # Updates arrive through our own WebhookServer, no Updater needed
+            builder = builder.updater(None)
+        self.app = builder.build()
+        # Saves user_data after each update, before the next process may pick up the user's next one
+        self.update_processor.after_update = self.app.update_persistence
+        self.storage = create_storage(MEMORY_BACKEND, MEMORY_FILE, MEMORY_DB, self.store)
+        self.memory = CachedMemoryManager(
+            MemoryManager(self.storage), MEMORY_LOOKBACK_DAYS, reload=MEMORY_BACKEND == "shared"
+        )
+        self.app.job_queue.run_repeating(
+            self.memory.flush_job, interval=MEMORY_FLUSH_INTERVAL, first=MEMORY_FLUSH_INTERVAL
+        )
+        self.deduper = Deduper(
+            self.memory, MEMORY_LOOKBACK_DAYS, DEDUPE_SAMPLE_SIZE, DEDUPE_THRESHOLD, DEDUPE_MAX_ENTRIES
+        )
+        self.app.job_queue.run_once(self.deduper.warm_job, 0)
+        if MEMORY_BACKEND == "shared":
+            self.app.job_queue.run_repeating(
+                self.deduper.refresh_job, interval=MEMORY_FLUSH_INTERVAL, first=MEMORY_FLUSH_INTERVAL
+            )
+        self.audio_cache = AudioCache(AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_MB * 1024 * 1024, store=shared_store)
+        self.scheduler = FairScheduler(OPENAI_MAX_CONCURRENCY)
+        self.openai = OpenAIClient(self.audio_cache, self.scheduler)
+        self.limiter = RateLimiter(parse_limits(RATE_LIMITS))
+        self.response_cache = ResponseCache(
+            RESPONSE_CACHE_DB, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, store=shared_store
+        )
+        self.content_store = ContentStore(CONTENT_DB)
+        self.glossary = Glossary(self.content_store)
+        self.progress = ProgressStore(PROGRESS_DIR, PROGRESS_SHARDS)
+        self.word_bank = WordBank(WORDS_FILE, recent_size=WORDS_RECENT_EXCLUDE)
+        self.app.job_queue.run_repeating(
+            self.word_bank.reload_job, interval=WORDS_RELOAD_INTERVAL, first=WORDS_RELOAD_INTERVAL
+        )
+
+        self.pool = ExercisePool(EXERCISE_POOL_SIZE) if EXERCISE_POOL_SIZE > 0 else None
+
+        # Rate limits and per-user request context, before any other handler
+        self.app.add_handler(GateHandler(self.limiter).get_handler(), group=-1)
 
         for handler in StartHandler.get_handlers():
             self.app.add_handler(handler)
 
-        dictate_handler = DictateHandler(self.memory, self.openai)
+        dictate_handler = DictateHandler(self.memory, self.openai, self.pool, self.deduper, self.progress)
         self.app.add_handler(dictate_handler.get_command_handler(), group=0)
-        self.app.add_handler(dictate_handler.get_message_handler(), group=1)
 
-        translation_handler = TranslationHandler(self.memory, self.openai)
+        translation_handler = TranslationHandler(
+            self.memory, self.openai, self.word_bank, self.pool, self.glossary, self.deduper, self.progress
+        )
         self.app.add_handler(translation_handler.get_command_handler(), group=0)
-        self.app.add_handler(translation_handler.get_message_handler(), group=2)
 
-        reading_handler = ReadingHandler(self.openai)
+        reading_handler = ReadingHandler(self.openai, self.pool, self.progress)
         self.app.add_handler(reading_handler.get_command_handler(), group=0)
 
-        word_handler = WordHandler(self.openai)
+        word_handler = WordHandler(self.openai, self.response_cache, self.content_store, self.progress)
         self.app.add_handler(word_handler.get_command_handler(), group=0)
 
-        explain_handler = ExplainHandler(self.openai)
+        explain_handler = ExplainHandler(self.openai, self.response_cache, self.progress)
         self.app.add_handler(explain_handler.get_command_handler(), group=0)
 
+        stats_handler = StatsHandler(self.progress)
+        self.app.add_handler(stats_handler.get_command_handler(), group=0)
+
+        # Free-text answers go to the checker of the user's current mode
+        self.router = ModeRouter()
+        self.router.register('dictate', dictate_handler.check_dictate)
+        self.router.register('translation', translation_handler.check_translation)
+        self.app.add_handler(self.router.get_message_handler(), group=1)
+
+        if self.pool:
+            self.pool.register('dictate', dictate_handler.generate_exercise)
+            self.pool.register('translation', translation_handler.generate_exercise)
+            self.pool.register('reading', reading_handler.generate_exercise)
+            for mode, level, style in parse_buckets(EXERCISE_POOL_BUCKETS):
+                self.pool.track(mode, level, style)
+            self.app.job_queue.run_repeating(self.pool.refill_job, interval=EXERCISE_POOL_INTERVAL, first=1)
+
+        REGISTRY.add_collector(self.collect_metrics)
+        self.metrics_server = None
+
+    def collect_metrics(self):
+        """Statistics the components keep themselves, as (name, type, labels, value) for /metrics."""
+        scheduler = self.scheduler.metrics()
+        yield "openai_slots_active", "gauge", {}, scheduler["active"]
+        yield "openai_slots_limit", "gauge", {}, scheduler["limit"]
+        yield "openai_queue_depth", "gauge", {}, scheduler["queue_depth"]
+        yield "openai_queue_wait_seconds_max", "gauge", {}, scheduler["wait_seconds_max"]
+        for outcome, count in self.openai.outcomes.items():
+            yield "openai_calls_total", "counter", {"outcome": outcome}, count
+        for model, breaker in self.openai.breakers.items():
+            yield "openai_circuit_open", "gauge", {"model": model}, int(breaker.state != "closed")
+        updates = self.update_processor.metrics()
+        yield "updates_running", "gauge", {}, updates["running"]
+        yield "updates_pending", "gauge", {}, updates["admitted"]
+        yield "updates_running_limit", "gauge", {}, updates["limit"]
+        yield "updates_rejected_total", "counter", {}, updates["rejected"]
+        for command, count in self.limiter.rejected.items():
+            yield "rate_limited_total", "counter", {"command": command}, count
+
+        cache = self.response_cache.metrics()
+        yield "response_cache_entries", "gauge", {}, cache["size"]
+        for result, counts in (("hit", cache["hits"]), ("miss", cache["misses"])):
+            for kind, count in counts.items():
+                yield "response_cache_requests_total", "counter", {"kind": kind, "result": result}, count
+
+        yield "audio_cache_bytes", "gauge", {}, self.audio_cache.total_bytes
+        yield "memory_pending_rows", "gauge", {}, len(self.memory.pending)
+
+        if self.pool:
+            pool = self.pool.metrics()
+            for bucket, size in pool["sizes"].items():
+                yield "exercise_pool_size", "gauge", {"bucket": bucket}, size
+            for result, counts in (("hit", pool["hits"]), ("miss", pool["misses"])):
+                for mode, count in counts.items():
+                    yield "exercise_pool_requests_total", "counter", {"mode": mode, "result": result}, count
+            for mode, count in pool["refill_errors"].items():
+                yield "exercise_pool_refill_errors_total", "counter", {"mode": mode}, count
+
+    async def post_init(self, application: Application) -> None:
+        # Only run_polling() calls this; the webhook server has its own /metrics
+        if METRICS_PORT:
+            self.metrics_server = MetricsServer(METRICS_PORT)
+            await self.metrics_server.start()
+
+    async def post_shutdown(self, application: Application) -> None:
+        if self.metrics_server:
+            await self.metrics_server.stop()
+        await self.openai.close()
+        await asyncio.to_thread(self.memory.flush)
+        self.storage.close()
+        self.response_cache.close()
+        self.content_store.close()
+        self.progress.close()
+        self.audio_cache.close()
+        self.persistence.close()
+        await self.store.close()
+
+    async def run_webhook(self):
+        secret = WEBHOOK_SECRET
+        if not secret:
+            if not WEBHOOK_URL:
+                raise RuntimeError("Webhook mode needs WEBHOOK_SECRET, or WEBHOOK_URL so the bot registers a generated one")
+            # Registered with set_webhook below, so only Telegram knows it
+            secret = secrets.token_urlsafe(32)
+            logger.info("WEBHOOK_SECRET is not set; using a random secret for this run.")
+        server = WebhookServer(self.app, secret, path=WEBHOOK_PATH, port=PORT, processor=self.update_processor)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        async with self.app:
+            if WEBHOOK_URL:
+                await self.app.bot.set_webhook(
+                    url=WEBHOOK_URL,
+                    secret_token=secret,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            await self.app.start()
+            await server.start()
+            try:
+                await stop.wait()
+            finally:
+                await server.stop()
+                await self.app.stop()
+        # Only run_polling() calls the post_shutdown hook by itself
+        await self.post_shutdown(self.app)
+
     def run(self):
-        print("Bot started...")
-        self.app.run_polling()
+        print(f"Bot started ({BOT_MODE})...")
+        if BOT_MODE == "webhook":
+            asyncio.run(self.run_webhook())
+        else:
+            self.app.run_polling()
 
 if __name__ == "__main__":
     BotApp().run()
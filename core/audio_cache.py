@@ -0,0 +1,353 @@
+import asyncio, collections, hashlib, json, logging, os, shutil, tempfile, threading, time
+from telegram.error import BadRequest
+from core import metrics
+from core.dedupe import split_sentences
+from core.storage import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+# TTS response format -> file extension; opus comes in an Ogg container, which Telegram plays as a voice note
+AUDIO_EXTENSIONS = {"mp3": "mp3", "opus": "ogg"}
+
+
+class AudioClip:
+    """
+    Synthesized audio ready to upload, held in memory and spooled to an
+    anonymous temporary file only above max_memory bytes.
+    """
+
+    def __init__(self, format="mp3", max_memory=2 * 1024 * 1024):
+        self.format = format
+        self.max_memory = max_memory
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.size = 0
+
+    @classmethod
+    def from_path(cls, path, format, max_memory=2 * 1024 * 1024):
+        clip = cls(format, max_memory)
+        with open(path, "rb") as f:
+            clip.write_from(f)
+        return clip
+
+    @property
+    def filename(self):
+        return "audio." + AUDIO_EXTENSIONS[self.format]
+
+    # Read as a file object by python-telegram-bot, which takes its file name from `name`
+    name = filename
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def write_from(self, f, block_size=64 * 1024):
+        """Appends the rest of the file object f, a block at a time."""
+        while block := f.read(block_size):
+            self.write(block)
+
+    def read(self):
+        self.file.seek(0)
+        return self.file.read()
+
+    def stream(self):
+        """The file rewound to the start, to hand on without reading a spooled clip into memory."""
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        self.file.close()
+
+
+class AudioCache:
+    """
+    Synthesized audio on disk, keyed by hash(text, voice, model, format).
+    max_bytes of 0 keeps nothing on disk: audio then only lives in memory
+    between synthesis and upload.
+
+    Files are evicted least-recently-used once the directory grows past
+    max_bytes. The Telegram file_id of every uploaded file is remembered, so a
+    repeated send is a file_id reference instead of a new upload; file_ids
+    are kept in file_ids.db, up to max_file_ids of the most recently set ones.
+    Given a shared `store`, file_ids are kept there instead, so a file
+    uploaded by one bot process is reused by all of them.
+    """
+
+    def __init__(self, directory, max_bytes, max_file_ids=10000, store=None):
+        self.directory = directory
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_file_ids = max_file_ids
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Leftovers of syntheses interrupted by a crash or redeploy
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)
+
+        self.entries = collections.OrderedDict()  # key -> size, least recently used first
+        extensions = tuple("." + ext for ext in AUDIO_EXTENSIONS.values())
+        files = [f for f in os.scandir(directory) if f.name.endswith(extensions)]
+        for entry in sorted(files, key=lambda f: f.stat().st_mtime):
+            self.entries[entry.name] = entry.stat().st_size
+        self.total_bytes = sum(self.entries.values())
+
+        self.file_ids_conn = connect_sqlite(os.path.join(directory, "file_ids.db"))
+        with self.lock:
+            self.file_ids_conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_ids (
+                    key TEXT PRIMARY KEY,
+                    file_id TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+            self.file_ids_conn.execute("CREATE INDEX IF NOT EXISTS idx_file_ids_updated ON file_ids (updated)")
+            self.file_ids_count = self.file_ids_conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+        self._import_file_ids_json(os.path.join(directory, "file_ids.json"))
+
+    def _import_file_ids_json(self, path):
+        """One-time import of the file_ids.json earlier versions rewrote on every upload."""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                file_ids = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable {path}: {e}")
+            return
+        now = time.time()
+        # The JSON kept insertion order, oldest first; keep that order in `updated`
+        rows = [(key, file_id, now - len(file_ids) + i) for i, (key, file_id) in enumerate(file_ids.items())]
+        with self.lock:
+            self.file_ids_conn.execute("BEGIN")
+            try:
+                self.file_ids_conn.executemany(
+                    "INSERT OR IGNORE INTO file_ids (key, file_id, updated) VALUES (?, ?, ?)", rows
+                )
+                self.file_ids_conn.execute("COMMIT")
+            except BaseException:
+                self.file_ids_conn.execute("ROLLBACK")
+                raise
+            self.file_ids_count = self.file_ids_conn.execute("SELECT COUNT(*) FROM file_ids").fetchone()[0]
+            self._evict_file_ids()
+        os.replace(path, path + ".migrated")
+        logger.info(f"Imported {len(rows)} file_ids from {path}.")
+
+    @staticmethod
+    def key(text, voice, model, format="mp3"):
+        """The file name of the audio, e.g. "<sha256>.mp3"."""
+        # MP3 keys leave the format out, so files cached before other formats existed stay valid
+        raw = f"{model}\0{voice}\0{text}" if format == "mp3" else f"{model}\0{voice}\0{format}\0{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest() + "." + AUDIO_EXTENSIONS[format]
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Returns the cached file path, or None if it is not on disk."""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        path = self.path(key)
+        if not os.path.exists(path):
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+            return None
+        os.utime(path)
+        return path
+
+    def temp_path(self, key):
+        """Path to write a new file to before it is added with commit()."""
+        return self.path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def save(self, clip, key):
+        """Writes a clip to the cache (a no-op when the disk cache is disabled); returns its path."""
+        if not self.enabled:
+            return None
+        temp_path = self.temp_path(key)
+        try:
+            with open(temp_path, "wb") as f:
+                shutil.copyfileobj(clip.stream(), f)
+        except OSError as e:
+            logger.warning(f"Could not cache audio {key}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return None
+        return self.commit(key, temp_path)
+
+    def commit(self, key, temp_path):
+        path = self.path(key)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self.lock:
+            self.total_bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    async def get_file_id(self, key):
+        if self.store:
+            file_id = await self.store.get(f"audio_file_id:{key}")
+            return file_id.decode("utf-8") if file_id else None
+        with self.lock:
+            row = self.file_ids_conn.execute("SELECT file_id FROM file_ids WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    async def set_file_id(self, key, file_id):
+        if self.store:
+            if file_id is None:
+                await self.store.delete(f"audio_file_id:{key}")
+            else:
+                await self.store.set(f"audio_file_id:{key}", file_id)
+            return
+        with self.lock:
+            if file_id is None:
+                cursor = self.file_ids_conn.execute("DELETE FROM file_ids WHERE key = ?", (key,))
+                self.file_ids_count -= cursor.rowcount
+                return
+            cursor = self.file_ids_conn.execute(
+                "INSERT OR IGNORE INTO file_ids (key, file_id, updated) VALUES (?, ?, ?)", (key, file_id, time.time())
+            )
+            if cursor.rowcount:
+                self.file_ids_count += 1
+            else:
+                self.file_ids_conn.execute(
+                    "UPDATE file_ids SET file_id = ?, updated = ? WHERE key = ?", (file_id, time.time(), key)
+                )
+            self._evict_file_ids()
+
+    def _evict_file_ids(self):
+        excess = self.file_ids_count - self.max_file_ids
+        if excess > 0:
+            self.file_ids_conn.execute(
+                "DELETE FROM file_ids WHERE key IN (SELECT key FROM file_ids ORDER BY updated LIMIT ?)", (excess,)
+            )
+            self.file_ids_count -= excess
+
+    def close(self):
+        with self.lock:
+            self.file_ids_conn.close()
+
+
+async def reply_cached_audio(message, openai_client, text, voice, clip=None):
+    """
+    Sends the audio for text/voice: by Telegram file_id if it was uploaded
+    before, otherwise the given clip or one synthesized now, straight from
+    memory. Opus audio goes out as a voice note, MP3 as an audio file.
+    """
+    cache = openai_client.audio_cache
+    key = openai_client.audio_key(text, voice)
+    voice_note = key.endswith("." + AUDIO_EXTENSIONS["opus"])
+    send = message.reply_voice if voice_note else message.reply_audio
+
+    file_id = await cache.get_file_id(key)
+    if file_id:
+        if clip:
+            clip.close()
+        try:
+            with metrics.stage("telegram_upload"):
+                sent = await send(file_id)
+            metrics.inc("audio_cache_total", result="file_id")
+            return sent
+        except BadRequest as e:
+            logger.warning(f"Cached file_id rejected by Telegram, re-uploading: {e}")
+            await cache.set_file_id(key, None)
+            clip = None
+
+    if clip is None:
+        clip = await openai_client.generate_audio(text, voice=voice)
+    try:
+        with metrics.stage("telegram_upload"):
+            sent = await send(clip, filename=clip.filename)
+        uploaded = sent.voice if voice_note else sent.audio
+        if uploaded:
+            await cache.set_file_id(key, uploaded.file_id)
+        if cache.enabled and not cache.get(key):
+            await asyncio.to_thread(cache.save, clip, key)
+    finally:
+        clip.close()
+    return sent
+
+
+def chunk_text(text, max_words=60):
+    """Groups the sentences of text into chunks of about max_words words; a longer sentence is a chunk of its own."""
+    chunks, current, words = [], [], 0
+    for sentence in split_sentences(text):
+        count = len(sentence.split())
+        if current and words + count > max_words:
+            chunks.append(" ".join(current))
+            current, words = [], 0
+        current.append(sentence)
+        words += count
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+async def reply_chunked_audio(message, openai_client, text, voice, joined=False, max_words=60, concurrency=3):
+    """
+    Synthesizes text in sentence chunks, at most `concurrency` at a time, so
+    long texts do not wait on one long TTS call. The chunks are sent in
+    order, each as soon as it is ready, so the first audio arrives after
+    about one chunk's synthesis. With `joined` MP3 chunks are concatenated
+    and sent as one file once all are done, which gives up the earlier first
+    audio for a single message; Opus chunks are always sent one by one, as
+    back-to-back Ogg streams are not one valid voice note.
+    """
+    chunks = chunk_text(text, max_words)
+    if len(chunks) <= 1:
+        return [await reply_cached_audio(message, openai_client, text, voice)]
+    if joined and openai_client.audio_key(text, voice).endswith("." + AUDIO_EXTENSIONS["opus"]):
+        joined = False
+    cache = openai_client.audio_cache
+    if joined and await cache.get_file_id(openai_client.audio_key(text, voice)):
+        return [await reply_cached_audio(message, openai_client, text, voice)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def synthesize(chunk):
+        if not joined and await cache.get_file_id(openai_client.audio_key(chunk, voice)):
+            return None  # reply_cached_audio() sends it by file_id
+        async with semaphore:
+            return await openai_client.generate_audio(chunk, voice=voice)
+
+    started = time.monotonic()
+    tasks = [asyncio.create_task(synthesize(chunk)) for chunk in chunks]
+    try:
+        if joined:
+            clips = await asyncio.gather(*tasks)
+            whole = AudioClip(clips[0].format, clips[0].max_memory)
+            for clip in clips:
+                whole.write_from(clip.stream())
+                clip.close()
+            metrics.record_stage("first_audio", time.monotonic() - started)
+            return [await reply_cached_audio(message, openai_client, text, voice, whole)]
+
+        sent = []
+        for chunk, task in zip(chunks, tasks):
+            sent.append(await reply_cached_audio(message, openai_client, chunk, voice, await task))
+            if len(sent) == 1:
+                metrics.record_stage("first_audio", time.monotonic() - started)
+        return sent
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled() and task.exception() is None and task.result() is not None:
+                task.result().close()
@@ -0,0 +1,187 @@
+"""
+Bulk content generation through the OpenAI Batch API, at half the price of
+single calls and outside the interactive rate limits.
+
+    python -m core.batch submit words|glossary [--limit N] [--chunk 20] [--wait] [--db PATH] [--dry-run]
+    python -m core.batch collect [--wait] [--db PATH]
+
+`submit` turns the words of the frequency list that have no stored content
+yet into JSONL requests built with the same prompts the handlers use, and
+starts a batch; `collect` checks the pending batches and stores the results
+of finished ones in the content store:
+
+- words: /word definitions, read by /word before it calls the API
+- glossary: English translations of the words, read by /translation
+
+Pending batches are recorded in the content store as well (kind 'batch'), so
+submit and collect can run in separate processes, hours apart. Batches take
+up to 24 hours; --wait keeps polling until they finish. --dry-run uses a fake
+client whose batches finish after a couple of polls and, unless --db is
+given, an in-memory store; it implies --wait.
+"""
+import argparse, asyncio, json, logging, time
+from config import CONTENT_DB, WORDS_FILE
+from core.content_store import ContentStore
+from core.glossary import GLOSSARY_VERSION, Glossary, parse_translations
+from core.prompts import WORD_PROMPT_VERSION, WORD_MODEL, GLOSSARY_MODEL, word_request, glossary_request
+from core.response_cache import normalize_input
+from core.utils import load_words_from_csv
+
+logger = logging.getLogger(__name__)
+
+# The Batch API accepts at most 50,000 requests per batch
+MAX_BATCH_REQUESTS = 50000
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class WordsJob:
+    name = "words"
+    model = WORD_MODEL
+
+    def __init__(self, store):
+        self.store = store
+
+    def todo(self, words, chunk):
+        done = self.store.keys('word', WORD_PROMPT_VERSION)
+        return list(dict.fromkeys(w for w in words if normalize_input(w) not in done))
+
+    def request(self, word):
+        return word_request(word)
+
+    def ingest(self, word, text):
+        self.store.put('word', normalize_input(word), text.strip(), WORD_PROMPT_VERSION, WORD_MODEL)
+        return 1
+
+
+class GlossaryJob:
+    """Asks for translations of `chunk` words per request, like the translation handler does for three."""
+    name = "glossary"
+    model = GLOSSARY_MODEL
+
+    def __init__(self, store):
+        self.store = store
+        self.glossary = Glossary(store)
+
+    def todo(self, words, chunk):
+        done = self.store.keys('glossary', GLOSSARY_VERSION)
+        todo = list(dict.fromkeys(w for w in words if normalize_input(w) not in done))
+        return [todo[i:i + chunk] for i in range(0, len(todo), chunk)]
+
+    def request(self, words):
+        return glossary_request(words)
+
+    def ingest(self, words, text):
+        translations = parse_translations(text, words)
+        self.glossary.add(translations)
+        if len(translations) < len(words):
+            logger.warning(f"No translation in the answer for {len(words) - len(translations)} of {words}.")
+        return len(translations)
+
+
+JOBS = {job.name: job for job in (WordsJob, GlossaryJob)}
+
+
+def pending_batches(store):
+    """{batch_id: {"job": name, "items": {custom_id: item}}} of the batches not collected yet."""
+    return {batch_id: json.loads(text) for batch_id, text in store.items('batch').items()}
+
+
+async def submit(client, store, job_name, words, chunk=20):
+    """Starts batches for the items of a job that are neither stored nor pending; returns their ids."""
+    job = JOBS[job_name](store)
+    pending = set()
+    for batch in pending_batches(store).values():
+        if batch["job"] == job_name:
+            pending.update(json.dumps(item) for item in batch["items"].values())
+    items = [item for item in job.todo(words, chunk) if json.dumps(item) not in pending]
+    if not items:
+        logger.info(f"Nothing to submit for {job_name}.")
+        return []
+
+    batch_ids = []
+    for start in range(0, len(items), MAX_BATCH_REQUESTS):
+        part = {f"{job_name}-{start + i}": item for i, item in enumerate(items[start:start + MAX_BATCH_REQUESTS])}
+        requests = [
+            {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": job.request(item)}
+            for custom_id, item in part.items()
+        ]
+        batch_id = await client.submit_batch(requests)
+        store.put('batch', batch_id, json.dumps({"job": job_name, "items": part}), 0, job.model)
+        batch_ids.append(batch_id)
+        logger.info(f"Submitted {job_name} batch {batch_id} with {len(requests)} requests.")
+    return batch_ids
+
+
+async def collect(client, store):
+    """Stores the results of the finished pending batches; returns how many batches are still running."""
+    running = 0
+    for batch_id, batch in pending_batches(store).items():
+        status, output_file_id, error_file_id = await client.get_batch(batch_id)
+        if status not in FINAL_STATUSES:
+            running += 1
+            logger.info(f"Batch {batch_id} ({batch['job']}) is {status}.")
+            continue
+
+        job = JOBS[batch["job"]](store)
+        stored = failed = 0
+        for file_id in (output_file_id, error_file_id):
+            if not file_id:
+                continue
+            for line in await client.batch_results(file_id):
+                item = batch["items"].get(line.get("custom_id"))
+                response = line.get("response") or {}
+                if item is None or response.get("status_code") != 200:
+                    failed += 1
+                    logger.error(f"Batch {batch_id} request {line.get('custom_id')} failed: "
+                                 f"{line.get('error') or response.get('body')}")
+                    continue
+                stored += job.ingest(item, response["body"]["choices"][0]["message"]["content"])
+        # Failed requests are not retried here; the next submit picks their items up again
+        store.delete('batch', batch_id)
+        logger.info(f"Batch {batch_id} ({batch['job']}) {status}: {stored} stored, {failed} failed requests.")
+    return running
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.batch")
+    parser.add_argument("command", choices=["submit", "collect"])
+    parser.add_argument("job", nargs="?", help=f"for submit: {', '.join(JOBS)}")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N words")
+    parser.add_argument("--chunk", type=int, default=20, help="words per glossary request")
+    parser.add_argument("--wait", action="store_true", help="poll until the pending batches finish")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between status checks")
+    parser.add_argument("--db", default=None, help=f"content store path (default {CONTENT_DB})")
+    parser.add_argument("--dry-run", action="store_true", help="use a fake OpenAI client, no network")
+    args = parser.parse_args(argv)
+    if args.command == "submit" and args.job not in JOBS:
+        parser.error(f"submit needs a job: {', '.join(JOBS)}")
+
+    if args.dry_run:
+        from core.fake_openai import FakeOpenAIClient
+        client = FakeOpenAIClient()
+        store = ContentStore(args.db or ":memory:")
+        args.wait = True
+        args.poll_interval = min(args.poll_interval, 0.1)
+    else:
+        from core.openai_client import OpenAIClient
+        client = OpenAIClient(audio_cache=None)
+        store = ContentStore(args.db or CONTENT_DB)
+
+    try:
+        if args.command == "submit":
+            words = load_words_from_csv(WORDS_FILE)[:args.limit]
+            await submit(client, store, args.job, words, args.chunk)
+            if not args.wait:
+                return
+        started = time.monotonic()
+        while await collect(client, store) and args.wait:
+            await asyncio.sleep(args.poll_interval)
+        logger.info(f"Collected in {time.monotonic() - started:.1f}s.")
+    finally:
+        await client.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import threading, time
+from core.storage import connect_sqlite
+
+
+class ContentStore:
+    """
+    Content generated ahead of time by offline jobs (e.g. /word definitions),
+    stored per (kind, key). Rows remember the prompt version they were made
+    with, so a prompt change makes old rows invisible instead of stale.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS content (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+                """
+            )
+
+    def get(self, kind, key, version):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM content WHERE kind = ? AND key = ? AND version = ?",
+                (kind, key, version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, kind, key, text, version, model):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO content (kind, key, version, model, text, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, version, model, text, time.time()),
+            )
+
+    def delete(self, kind, key):
+        with self.lock:
+            self.conn.execute("DELETE FROM content WHERE kind = ? AND key = ?", (kind, key))
+
+    def items(self, kind):
+        """Returns {key: text} of every row of a kind, whatever its version."""
+        with self.lock:
+            cursor = self.conn.execute("SELECT key, text FROM content WHERE kind = ?", (kind,))
+            return dict(cursor.fetchall())
+
+    def keys(self, kind, version):
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT key FROM content WHERE kind = ? AND version = ?", (kind, version)
+            )
+            return {row[0] for row in cursor}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,213 @@
+import asyncio, collections, hashlib, itertools, logging, random, re, threading
+from core.response_cache import normalize_input
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16  # 4 rows per band: pairs from about 0.5 similarity up become candidates
+SHINGLE_SIZE = 4
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def normalize_sentence(text):
+    """normalize_input() without punctuation, so "Hoi!" and "hoi" are the same sentence."""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize_input(text)).split())
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+def minhash(text):
+    """MinHash signature over the character shingles of a normalized sentence."""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class SentenceIndex:
+    """
+    Sentences generated for one mode: exact matches by normalized hash, near
+    matches by MinHash with LSH banding. Holds at most max_entries sentences,
+    dropping the oldest first.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.ids = itertools.count()
+        self.entries = collections.OrderedDict()  # id -> (sentence, digest, signature)
+        self.digests = {}  # digest -> id
+        self.bands = [collections.defaultdict(set) for _ in range(BANDS)]
+
+    @staticmethod
+    def _band_keys(signature):
+        rows = NUM_PERM // BANDS
+        return [signature[i * rows:(i + 1) * rows] for i in range(BANDS)]
+
+    def add(self, sentence):
+        normalized = normalize_sentence(sentence)
+        if not normalized:
+            return
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self.digests:
+            return
+        signature = minhash(normalized)
+        entry_id = next(self.ids)
+        self.entries[entry_id] = (sentence, digest, signature)
+        self.digests[digest] = entry_id
+        for band, key in zip(self.bands, self._band_keys(signature)):
+            band[key].add(entry_id)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, entry_id):
+        _, digest, signature = self.entries.pop(entry_id)
+        self.digests.pop(digest, None)
+        for band, key in zip(self.bands, self._band_keys(signature)):
+            ids = band.get(key)
+            if ids:
+                ids.discard(entry_id)
+                if not ids:
+                    del band[key]
+
+    def find(self, sentence, threshold):
+        """Returns the indexed sentence that `sentence` duplicates, or None."""
+        normalized = normalize_sentence(sentence)
+        if not normalized:
+            return None
+        entry_id = self.digests.get(hashlib.sha1(normalized.encode("utf-8")).digest())
+        if entry_id is not None:
+            return self.entries[entry_id][0]
+        signature = minhash(normalized)
+        candidates = set()
+        for band, key in zip(self.bands, self._band_keys(signature)):
+            candidates |= band.get(key, set())
+        for candidate in candidates:
+            indexed, _, indexed_signature = self.entries[candidate]
+            if similarity(signature, indexed_signature) >= threshold:
+                return indexed
+        return None
+
+    def sample(self, k):
+        """Up to k sentences for a prompt: the most recent half, the rest picked at random from older ones."""
+        sentences = [entry[0] for entry in self.entries.values()]
+        if len(sentences) <= k:
+            return sentences
+        recent_count = (k + 1) // 2
+        older = sentences[:-recent_count]
+        return random.sample(older, k - recent_count) + sentences[-recent_count:]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class Deduper:
+    """
+    Keeps generated exercises from repeating without pasting the whole history
+    into every prompt: the prompt gets a small sample of recent sentences, and
+    each new generation is checked against an index of everything generated
+    in the lookback window (see generate_unique()).
+
+    Indexes are filled from memory the first time a mode is used (or by
+    warm_job at startup) and kept current by add().
+    """
+
+    def __init__(self, memory, lookback_days=7, sample_size=10, threshold=0.6, max_entries=5000,
+                 modes=("dictate", "translation")):
+        self.memory = memory
+        self.modes = modes
+        self.lookback_days = lookback_days
+        self.sample_size = sample_size
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.indexes = {}  # mode -> SentenceIndex
+        self.lock = threading.Lock()
+
+    def _build(self, mode):
+        index = SentenceIndex(self.max_entries)
+        for text in self.memory.get_recent_sentences(mode, self.lookback_days):
+            for sentence in split_sentences(text):
+                index.add(sentence)
+        logger.info(f"Dedupe index for {mode}: {len(index)} sentences.")
+        return index
+
+    def _index(self, mode):
+        index = self.indexes.get(mode)
+        if index is None:
+            index = self.indexes[mode] = self._build(mode)
+        return index
+
+    def sample(self, mode):
+        with self.lock:
+            return self._index(mode).sample(self.sample_size)
+
+    def find_duplicate(self, mode, text):
+        """Returns a sentence of text that was generated before (exactly or nearly), or None."""
+        with self.lock:
+            index = self._index(mode)
+            for sentence in split_sentences(text):
+                duplicate = index.find(sentence, self.threshold)
+                if duplicate:
+                    return sentence
+        return None
+
+    def add(self, mode, text):
+        with self.lock:
+            index = self._index(mode)
+            for sentence in split_sentences(text):
+                index.add(sentence)
+
+    async def generate_unique(self, mode, generate, attempts=3):
+        """
+        Awaits generate() for a text until it repeats nothing generated
+        before, at most `attempts` times; the last text is used either way.
+        The text is added to the index.
+        """
+        for attempt in range(1, attempts + 1):
+            text = await generate()
+            duplicate = self.find_duplicate(mode, text)
+            if duplicate is None:
+                break
+            metrics.inc("dedupe_collisions_total", mode=mode)
+            logger.info(f"Generated {mode} text repeats '{duplicate}' (attempt {attempt}/{attempts}).")
+        self.add(mode, text)
+        return text
+
+    def warm(self):
+        for mode in self.modes:
+            if mode in self.indexes:
+                continue
+            index = self._build(mode)
+            with self.lock:
+                self.indexes.setdefault(mode, index)
+
+    def refresh(self):
+        """Adds sentences that other bot processes stored in the shared history since the last call."""
+        for mode in list(self.indexes):
+            sentences = [s for text in self.memory.get_recent_sentences(mode, self.lookback_days)
+                         for s in split_sentences(text)]
+            with self.lock:
+                index = self.indexes[mode]
+                for sentence in sentences:
+                    index.add(sentence)
+
+    async def refresh_job(self, context=None):
+        await asyncio.to_thread(self.refresh)
+
+    async def warm_job(self, context=None):
+        """Job-queue callback: builds the indexes at startup, off the event loop."""
+        await asyncio.to_thread(self.warm)
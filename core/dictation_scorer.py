@@ -0,0 +1,176 @@
+import re, unicodedata
+
+# Words: letters (accented ones included), digits and inner apostrophes as in "z'n" or "'s"
+TOKEN_PATTERN = re.compile(r"\w+(?:['’]\w+)*|['’]\w+")
+
+# Error points per error class; the score is 10 minus the points per expected word
+ERROR_WEIGHTS = {
+    'diacritics': 0.25,  # een / één
+    'spelling': 0.5,     # right word, misspelled
+    'grammar': 0.75,     # right word, wrong form: wacht / wachten, gebeurd / gebeurt
+    'order': 0.5,        # right word, wrong place
+    'missing': 1.0,
+    'extra': 1.0,
+    'wrong': 1.0,        # a different word
+}
+
+ERROR_LABELS = {
+    'diacritics': "accent",
+    'spelling': "spelling",
+    'grammar': "word form",
+    'order': "word order",
+    'missing': "missing word",
+    'extra': "extra word",
+    'wrong': "wrong word",
+}
+
+# Slips a learner can fix alone; any other error class deserves an explanation
+MINOR_ERRORS = {'diacritics', 'spelling', 'order'}
+
+# Endings that turn one form of a Dutch word into another (verb person, tense, plural, adjective -e)
+INFLECTION_ENDINGS = {"e", "n", "en", "t", "d", "te", "de", "ten", "den", "s"}
+
+
+def normalize_token(token):
+    """Case and Unicode form do not count; punctuation is already dropped by tokenize()."""
+    return unicodedata.normalize("NFC", token).lower().replace("’", "'")
+
+
+def strip_diacritics(token):
+    return "".join(c for c in unicodedata.normalize("NFD", token) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text)
+
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+def is_inflection(a, b):
+    """Whether a and b are forms of the same word: one plus an ending is the other, or they differ in a final d / t."""
+    short, long = sorted((a, b), key=len)
+    if len(short) >= 2 and long.startswith(short) and long[len(short):] in INFLECTION_ENDINGS:
+        return True
+    return len(a) == len(b) >= 2 and a[:-1] == b[:-1] and {a[-1], b[-1]} == {"d", "t"}
+
+
+def compare_tokens(expected, actual):
+    """Error class of writing `actual` for `expected`: None when they match."""
+    expected, actual = normalize_token(expected), normalize_token(actual)
+    if expected == actual:
+        return None
+    if strip_diacritics(expected) == strip_diacritics(actual):
+        return 'diacritics'
+    # Checked before the typo rule, which would call a missing -en a misspelling
+    if is_inflection(strip_diacritics(expected), strip_diacritics(actual)):
+        return 'grammar'
+    # Up to one typo per three letters still counts as the same word; in words of up to
+    # three letters one letter more likely makes another word (op / om, dat / wat)
+    if len(expected) >= 4 and edit_distance(strip_diacritics(expected), strip_diacritics(actual)) <= len(expected) // 3:
+        return 'spelling'
+    return 'wrong'
+
+
+def align(expected_tokens, actual_tokens):
+    """
+    Word-level edit-distance alignment. Returns a list of
+    (error_class, expected_word, actual_word) with error_class None for
+    matching words; missing words have actual_word None, extra ones
+    expected_word None.
+    """
+    n, m = len(expected_tokens), len(actual_tokens)
+    classes = [[compare_tokens(e, a) for a in actual_tokens] for e in expected_tokens]
+    cost = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        cost[i][0] = float(i)
+    for j in range(1, m + 1):
+        cost[0][j] = float(j)
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            error = classes[i - 1][j - 1]
+            cost[i][j] = min(
+                cost[i - 1][j] + 1,
+                cost[i][j - 1] + 1,
+                cost[i - 1][j - 1] + (ERROR_WEIGHTS[error] if error else 0),
+            )
+
+    steps = []
+    i, j = n, m
+    while i or j:
+        # On ties a missing + extra pair wins over a wrong word, so that swapped words show up as word order errors
+        if i and j and classes[i - 1][j - 1] is None and cost[i][j] == cost[i - 1][j - 1]:
+            steps.append((None, expected_tokens[i - 1], actual_tokens[j - 1]))
+            i, j = i - 1, j - 1
+        elif i and cost[i][j] == cost[i - 1][j] + 1:
+            steps.append(('missing', expected_tokens[i - 1], None))
+            i -= 1
+        elif j and cost[i][j] == cost[i][j - 1] + 1:
+            steps.append(('extra', None, actual_tokens[j - 1]))
+            j -= 1
+        else:
+            steps.append((classes[i - 1][j - 1], expected_tokens[i - 1], actual_tokens[j - 1]))
+            i, j = i - 1, j - 1
+    steps.reverse()
+    return _find_moved_words(steps)
+
+
+def _find_moved_words(steps):
+    """Turns a missing word that also appears as an extra word elsewhere into one word order error."""
+    result = list(steps)
+    for index, step in enumerate(result):
+        if step is None or step[0] != 'missing':
+            continue
+        for other, candidate in enumerate(result):
+            if candidate and candidate[0] == 'extra' and compare_tokens(step[1], candidate[2]) in (None, 'diacritics'):
+                result[index] = ('order', step[1], candidate[2])
+                result[other] = None
+                break
+    return [step for step in result if step is not None]
+
+
+class DictationResult:
+    def __init__(self, expected, actual, steps):
+        self.expected = expected
+        self.actual = actual
+        self.steps = steps
+        self.errors = [step for step in steps if step[0]]
+        words = sum(1 for step in steps if step[1] is not None) or 1
+        points = sum(ERROR_WEIGHTS[error] for error, _, _ in self.errors)
+        self.score = round(max(0.0, 10 * (1 - points / words)), 1)
+
+    @property
+    def perfect(self):
+        return not self.errors
+
+    @property
+    def minor(self):
+        """Whether every error is a slip (accent, spelling, word order) rather than a wrong, missing or extra word."""
+        return all(error in MINOR_ERRORS for error, _, _ in self.errors)
+
+    def describe_errors(self):
+        """One line per error, e.g. "'huis' → 'huys' (spelling)"."""
+        lines = []
+        for error, expected, actual in self.errors:
+            if error == 'missing':
+                lines.append(f"'{expected}' is missing")
+            elif error == 'extra':
+                lines.append(f"'{actual}' is not in the text")
+            elif error == 'order':
+                lines.append(f"'{expected}' is in the wrong place")
+            else:
+                lines.append(f"'{expected}' → '{actual}' ({ERROR_LABELS[error]})")
+        return lines
+
+
+def score_dictation(expected, actual):
+    """Compares a written answer with the dictated text, ignoring case and punctuation."""
+    return DictationResult(expected, actual, align(tokenize(expected), tokenize(actual)))
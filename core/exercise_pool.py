@@ -0,0 +1,122 @@
+import asyncio, collections, logging, time
+from core import metrics
+from core.rate_limit import current_request
+from core.metrics import current_trace
+
+logger = logging.getLogger(__name__)
+
+
+def parse_buckets(spec):
+    """Parses "dictate:B1,translation:B1:L" into [("dictate", "B1", None), ("translation", "B1", "L")]."""
+    buckets = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split(":") if p.strip()]
+        if len(parts) < 2:
+            continue
+        mode, level = parts[0].lower(), parts[1].upper()
+        style = parts[2].upper() if len(parts) > 2 else None
+        buckets.append((mode, level, style))
+    return buckets
+
+
+class ExercisePool:
+    """
+    Ready-made exercises per (mode, level, style) bucket.
+
+    A producer is registered per mode: an async function (level, style) that
+    returns an exercise dict. The refill job keeps every tracked bucket at
+    `size` exercises; popping an exercise also schedules a refill of its bucket.
+    """
+
+    def __init__(self, size=2):
+        self.size = size
+        self.producers = {}  # mode -> async (level, style) -> exercise
+        self.buckets = {}  # (mode, level, style) -> deque of exercises
+        self.refilling = set()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.refill_errors = collections.Counter()
+        self.refill_seconds = {}  # mode -> (count, total seconds, last seconds)
+
+    def register(self, mode, producer):
+        self.producers[mode] = producer
+
+    def track(self, mode, level, style=None):
+        if mode in self.producers:
+            self.buckets.setdefault((mode, level, style), collections.deque())
+        else:
+            logger.warning(f"No exercise producer for mode '{mode}', bucket ignored.")
+
+    def pop(self, mode, level, style=None):
+        """Returns a ready exercise or None on a miss (the caller generates it live)."""
+        key = (mode, level, style)
+        bucket = self.buckets.get(key)
+        exercise = bucket.popleft() if bucket else None
+        if exercise is None:
+            self.misses[mode] += 1
+        else:
+            self.hits[mode] += 1
+        if bucket is not None:
+            self._schedule_refill(key)
+        return exercise
+
+    def _schedule_refill(self, key):
+        if key in self.refilling:
+            return
+        try:
+            asyncio.get_running_loop().create_task(self._refill(key))
+        except RuntimeError:
+            # No running loop: the periodic job will refill the bucket
+            pass
+
+    async def _refill(self, key):
+        if key in self.refilling:
+            return 0
+        self.refilling.add(key)
+        # Background work: not queued as, reported to, or timed for the user whose pop triggered it
+        current_request.set(None)
+        current_trace.set(None)
+        mode, level, style = key
+        bucket = self.buckets[key]
+        added = 0
+        try:
+            while len(bucket) < self.size:
+                started = time.monotonic()
+                try:
+                    exercise = await self.producers[mode](level, style)
+                except Exception as e:
+                    self.refill_errors[mode] += 1
+                    logger.error(f"Failed to refill exercise pool {key}: {e}")
+                    break
+                elapsed = time.monotonic() - started
+                count, total, _ = self.refill_seconds.get(mode, (0, 0.0, 0.0))
+                self.refill_seconds[mode] = (count + 1, total + elapsed, elapsed)
+                metrics.observe("exercise_pool_refill_seconds", elapsed, mode=mode)
+                bucket.append(exercise)
+                added += 1
+        finally:
+            self.refilling.discard(key)
+        return added
+
+    async def refill_job(self, context=None):
+        """Job-queue callback: tops up every tracked bucket."""
+        added = await asyncio.gather(*(self._refill(key) for key in list(self.buckets)))
+        if any(added):
+            logger.info(f"Exercise pool refilled: {self.metrics()}")
+
+    def metrics(self):
+        total_hits = sum(self.hits.values())
+        total = total_hits + sum(self.misses.values())
+        return {
+            "sizes": {":".join(filter(None, key)): len(b) for key, b in self.buckets.items()},
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "hit_rate": total_hits / total if total else None,
+            "refill_errors": dict(self.refill_errors),
+            "refill_avg_seconds": {
+                mode: total_s / count for mode, (count, total_s, _) in self.refill_seconds.items()
+            },
+            "refill_last_seconds": {
+                mode: last for mode, (_, _, last) in self.refill_seconds.items()
+            },
+        }
@@ -0,0 +1,72 @@
+import asyncio, itertools, json
+from types import SimpleNamespace
+
+
+class FakeOpenAIClient:
+    """
+    Offline stand-in for OpenAIClient with the same chat_completion and batch
+    interface. Answers are canned text derived from the prompt, returned after
+    `latency` seconds; a batch completes on its `batch_polls`-th status check.
+    """
+
+    def __init__(self, latency=0.0, batch_polls=2):
+        self.latency = latency
+        self.batch_polls = batch_polls
+        self.calls = 0
+        self.ids = itertools.count(1)
+        self.batches = {}  # batch id -> {"polls", "output_file_id"}
+        self.files = {}  # file id -> result lines
+
+    async def chat_completion(self, messages, model="gpt-4o", **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        content = f"[{model}] " + " ".join(prompt.split())[:200]
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt.split()),
+            completion_tokens=len(content.split()),
+            total_tokens=len(prompt.split()) + len(content.split()),
+        )
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def stream_chat_completion(self, messages, model="gpt-4o", **kwargs):
+        from core.openai_client import ChatStream
+        answer = ChatStream(model)
+        answer.model = model
+        answer.pieces = self._stream_pieces(messages, model, **kwargs)
+        return answer
+
+    async def _stream_pieces(self, messages, model, **kwargs):
+        response = await self.chat_completion(messages, model, **kwargs)
+        for word in response.choices[0].message.content.split(" "):
+            yield word + " "
+
+    async def submit_batch(self, requests, endpoint="/v1/chat/completions"):
+        results = []
+        for request in requests:
+            response = await self.chat_completion(**request["body"])
+            body = {
+                "model": response.model,
+                "choices": [{"index": 0, "message": vars(response.choices[0].message)}],
+                "usage": vars(response.usage),
+            }
+            results.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": body}})
+        number = next(self.ids)
+        self.files[f"file-{number}"] = json.loads(json.dumps(results))
+        self.batches[f"batch-{number}"] = {"polls": 0, "output_file_id": f"file-{number}"}
+        return f"batch-{number}"
+
+    async def get_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        batch["polls"] += 1
+        if batch["polls"] < self.batch_polls:
+            return "in_progress", None, None
+        return "completed", batch["output_file_id"], None
+
+    async def batch_results(self, file_id):
+        return self.files[file_id]
+
+    async def close(self):
+        pass
@@ -0,0 +1,39 @@
+import re
+from core.response_cache import normalize_input
+from core.prompts import GLOSSARY_MODEL
+
+# Bump when the word translation prompt changes
+GLOSSARY_VERSION = 1
+
+TRANSLATION_PATTERN = re.compile(r"'([^']+)'\s*[-–—:]\s*([^,'\n]+)")
+
+
+def parse_translations(text, words):
+    """Extracts {word: translation} from an answer like "'huis' - house, 'boom' - tree"."""
+    wanted = {normalize_input(w): w for w in words}
+    result = {}
+    for word, translation in TRANSLATION_PATTERN.findall(text):
+        original = wanted.get(normalize_input(word))
+        translation = translation.strip().rstrip(".")
+        if original and translation:
+            result[original] = translation
+    return result
+
+
+class Glossary:
+    """Dutch -> English word translations learned from earlier answers, kept in the content store."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def lookup(self, words):
+        found = {}
+        for word in words:
+            translation = self.store.get('glossary', normalize_input(word), GLOSSARY_VERSION)
+            if translation:
+                found[word] = translation
+        return found
+
+    def add(self, translations):
+        for word, translation in translations.items():
+            self.store.put('glossary', normalize_input(word), translation, GLOSSARY_VERSION, GLOSSARY_MODEL)
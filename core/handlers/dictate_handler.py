@@ -1,9 +1,14 @@
 from telegram import Update, ForceReply
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
-from config import AUTHORIZED_USERS, MEMORY_FILE, VALID_LEVELS, VOICES, NUMBERS
+from telegram.ext import ContextTypes, CommandHandler
+from config import AUTHORIZED_USERS, MEMORY_FILE, VALID_LEVELS, VOICES, NUMBERS, DEDUPE_ATTEMPTS, DICTATE_LOCAL_MAX_ERRORS, DICTATE_LOCAL_MIN_SCORE
+from core import metrics
+from core.metrics import record_stage, stage, traced
+from core.dictation_scorer import score_dictation
 from core.utils import load_words_from_csv
 from core.memory import MemoryManager
-import logging, random
+from core.audio_cache import reply_cached_audio
+from core.streaming import stream_reply
+import logging, random, time
 
 
 logger = logging.getLogger(__name__)
@@ -14,16 +19,15 @@ def is_authorized(user_id: int) -> bool:
 
 
 class DictateHandler:
-    def __init__(self, memory, openai_client):
+    def __init__(self, memory, openai_client, pool=None, deduper=None, progress=None):
         self.memory = memory
         self.openai = openai_client
+        self.pool = pool
+        self.deduper = deduper
+        self.progress = progress
 
     def get_command_handler(self):
-        return CommandHandler("dictate", self.run)
-    
-    def get_message_handler(self):
-        # block=False ensures this handler won't stop other message handlers.
-        return MessageHandler(filters.TEXT & ~filters.COMMAND, self.check_dictate, block=False)
+        return CommandHandler("dictate", traced("dictate", self.run))
 
     async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
@@ -45,8 +49,34 @@ class DictateHandler:
 
         context.user_data['dictate_level'] = level
 
-        recent_sentences = self.memory.get_recent_sentences(context.user_data['mode'])
+        try:
+            with stage("pool"):
+                exercise = self.pool.pop('dictate', level) if self.pool else None
+            if exercise is None:
+                exercise = await self.generate_exercise(level)
+
+            sentence_to_dictate = exercise['text']
+
+            # Save the generated sentence
+            context.user_data['dictation_text'] = sentence_to_dictate
+
+            # Sending an audio file
+            await reply_cached_audio(update.message, self.openai, exercise['text'], exercise['voice'], exercise['audio'])
+            if self.progress:
+                self.progress.record_exercise(user.id, 'dictate', level, sentence_to_dictate)
+            logger.info(f"User {update.effective_user.id} started the dictation level {level}.")
 
+        except Exception as e:
+            logger.error(f"Error in dictate: {e}")
+            await update.message.reply_text("An error occurred while generating the dictation. Try again.")
+
+    async def generate_exercise(self, level, style=None):
+        """Generates a dictation for the level: returns the sentences and their audio."""
+        # A bounded sample keeps the prompt the same size however long the history is
+        with stage("memory_read"):
+            recent_sentences = self.deduper.sample('dictate') if self.deduper else []
+
+        prompt_started = time.monotonic()
         topics_n = random.choice(NUMBERS)
 
         if level != "N":
@@ -78,9 +108,10 @@ class DictateHandler:
                             Output alleen de twee zinnen in tekst, zonder vertaling of uitleg."""
         if recent_sentences:
             prompt += f"\n ⚠️ Do not repeat any of these sentences: {recent_sentences}"
+        record_stage("prompt_build", time.monotonic() - prompt_started)
 
-        try:
-            response = self.openai.chat_completion(
+        async def generate():
+            response = await self.openai.chat_completion(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a useful assistant in creating educational materials."},
@@ -92,38 +123,28 @@ class DictateHandler:
                 presence_penalty=0.5, 
                 frequency_penalty=0.3
             )
+            return response.choices[0].message.content.strip()
 
-            sentence_to_dictate = response.choices[0].message.content.strip()
-        
-            # Save the generated sentence
-            context.user_data['dictation_text'] = sentence_to_dictate
-
-            self.memory.add_sentence(context.user_data['mode'], sentence_to_dictate)
-            
-            # Select a random voice
-            selected_voice = random.choice(VOICES)
+        if self.deduper:
+            # Regenerates when the sentences repeat earlier ones
+            sentence_to_dictate = await self.deduper.generate_unique('dictate', generate, DEDUPE_ATTEMPTS)
+        else:
+            sentence_to_dictate = await generate()
+        self.memory.add_sentence('dictate', sentence_to_dictate)
 
-            # Generate an audio file using the OpenAI client
-            audio_path = self.openai.generate_audio(sentence_to_dictate, voice=selected_voice)
+        # Select a random voice
+        selected_voice = random.choice(VOICES)
 
-            # Sending an audio file
-            await update.message.reply_audio(audio=open(audio_path, "rb"))
-            logger.info(f"User {update.effective_user.id} started the dictation level {level}.")
+        # Generate the audio now, so sending it later needs no TTS call
+        audio = await self.openai.generate_audio(sentence_to_dictate, voice=selected_voice)
 
-        except Exception as e:
-            logger.error(f"Error in dictate: {e}")
-            await update.message.reply_text("An error occurred while generating the dictation. Try again.")
+        return {'text': sentence_to_dictate, 'voice': selected_voice, 'audio': audio}
 
 
     async def check_dictate(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Проверяет перевод, отправленный пользователем."""
-        logger.info(f"DICTATE DEBUG — received update: {update}")
+        """Проверяет диктант, отправленный пользователем. Called by the ModeRouter in 'dictate' mode."""
         user = update.effective_user
 
-        mode = context.user_data.get("mode")
-        if mode != "dictate":
-            return
-
         user_text = update.message.text.strip()
         correct_text = context.user_data.get("dictation_text")
 
@@ -131,36 +152,52 @@ class DictateHandler:
             await update.message.reply_text("Please start with /dictate first.")
             return
         
-        user_text_normalized = user_text.lower()
-        correct_text_normalized = correct_text.lower()
-
-        logger.info(f"check_dictate triggered, mode={mode}")
-
-        logger.info(f"check_dictate triggered, mode={context.user_data.get('mode')}, text={update.message.text}")
+        logger.debug(f"check_dictate triggered for user {user.id}")
+
+        with stage("score"):
+            result = score_dictation(correct_text, user_text)
+        if self.progress:
+            self.progress.record_answer(user.id, 'dictate', user_text, result.score)
+
+        # (Near-)perfect answers need no explanation: reply at once, without OpenAI.
+        # A wrong, missing or extra word, or a wrong word form, always gets one.
+        near_perfect = (
+            result.minor
+            and len(result.errors) <= DICTATE_LOCAL_MAX_ERRORS
+            and result.score >= DICTATE_LOCAL_MIN_SCORE
+        )
+        if result.perfect or near_perfect:
+            metrics.inc("dictation_checks_total", checker="local")
+            if result.perfect:
+                reply = f"✅ Correct!\n\n📝 {correct_text}\n\n⭐ Score: {result.score:g}/10"
+            else:
+                errors = "\n".join(f"• {line}" for line in result.describe_errors())
+                reply = f"Almost! 👍\n\n📝 {correct_text}\n\n{errors}\n\n⭐ Score: {result.score:g}/10"
+            await update.message.reply_text(reply)
+            return
 
-        # Form a request to OpenAI for feedback
+        # Form a request to OpenAI for feedback on the differences found above
+        metrics.inc("dictation_checks_total", checker="openai")
         try:
+            differences = "\n".join(f"- {line}" for line in result.describe_errors())
             feedback_prompt = (
-                f"The original dictation text was: '{correct_text_normalized}'. "
-                f"The user provided this written text based on the dictation: '{user_text_normalized}'. "
-                f"First send the original dictation text to user. "
-                f"Then your task is to compare two texts. "
-                f"Check if the user's text is correct. If it is, respond with 'Correct!' "
-                f"If it is incorrect, list all specific errors. Do not rewrite the sentence. Only list the differences. "
+                f"The original Dutch dictation text was: '{correct_text}'. "
+                f"The user wrote: '{user_text}'. "
+                f"A word-by-word comparison found these errors:\n{differences}\n"
+                f"Briefly explain each error (e.g. the spelling rule involved). Do not rewrite the sentence. "
                 f"Your entire answer must be short and direct. "
             )
 
-            response = self.openai.chat_completion(
+            chunks = self.openai.stream_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a dictation checker for Dutch language learning bot."},
                     {"role": "user", "content": feedback_prompt},
                 ],
-                max_tokens=400,
+                max_tokens=300,
             )
-
-            feedback = response.choices[0].message.content.strip()
-            await update.message.reply_text(feedback, parse_mode="Markdown", disable_web_page_preview=True)
+            prefix = f"📝 {correct_text}\n⭐ Score: {result.score:g}/10\n\n"
+            await stream_reply(update.message, chunks, prefix=prefix)
 
         except Exception as e:
             logger.error(f"Error in check_dictate: {e}")
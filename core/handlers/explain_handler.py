@@ -1,22 +1,29 @@
 from telegram import Update, ForceReply
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from config import AUTHORIZED_USERS
+from core.metrics import stage, traced
+from core.streaming import reply_formatted, stream_reply
 import logging, random
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Bump when the prompt below changes, so cached answers from the old prompt are not reused
+EXPLAIN_PROMPT_VERSION = 1
+
 def is_authorized(user_id: int) -> bool:
     return user_id in AUTHORIZED_USERS
 
 
 class ExplainHandler:
-    def __init__(self, openai_client):
+    def __init__(self, openai_client, response_cache=None, progress=None):
         self.openai = openai_client
+        self.response_cache = response_cache
+        self.progress = progress
 
     def get_command_handler(self):
-        return CommandHandler("explain", self.run)
+        return CommandHandler("explain", traced("explain", self.run))
 
     async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
@@ -30,6 +37,8 @@ class ExplainHandler:
             sentence = 'Waarom bestaat er überhaupt iets, en niet niets?'
 
         context.user_data['mode'] = 'explain'
+        if self.progress:
+            self.progress.record_exercise(user.id, 'explain', text=sentence)
 
         prompt = (
             f"Explain the Dutch grammar of the following sentence or rule: '{sentence}'. "
@@ -40,7 +49,16 @@ class ExplainHandler:
         )
 
         try:
-            response = self.openai.chat_completion(
+            cached = None
+            if self.response_cache:
+                with stage("cache_lookup"):
+                    cached = await self.response_cache.get('explain', sentence, EXPLAIN_PROMPT_VERSION, "gpt-4o")
+            if cached:
+                await reply_formatted(update.message, cached)
+                logger.info(f"User {update.effective_user.id} got a cached explain answer for: {sentence}.")
+                return
+
+            chunks = self.openai.stream_chat_completion(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a helpful Dutch grammar assistant."},
@@ -50,10 +68,11 @@ class ExplainHandler:
                 temperature=0.4,
                 top_p=0.9
             )
+            explanation = await stream_reply(update.message, chunks)
+            # A fallback model's answer is not cached as gpt-4o's
+            if self.response_cache and not chunks.degraded:
+                await self.response_cache.put('explain', sentence, EXPLAIN_PROMPT_VERSION, "gpt-4o", explanation)
 
-            explanation = response.choices[0].message.content.strip()
-
-            await update.message.reply_text(explanation, parse_mode="Markdown", disable_web_page_preview=True)
             logger.info(f"User {update.effective_user.id} requested grammar explanation for: {sentence}.")
 
         except Exception as e:
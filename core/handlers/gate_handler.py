@@ -0,0 +1,53 @@
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+from config import AUTHORIZED_USERS
+from core.rate_limit import RequestContext, current_request
+from core.metrics import RequestTrace, current_trace, stage
+import logging, math
+
+logger = logging.getLogger(__name__)
+
+def is_authorized(user_id: int) -> bool:
+    return user_id in AUTHORIZED_USERS
+
+
+class GateHandler:
+    """
+    Runs before every other handler (group -1): records which user the update
+    belongs to, so model calls can be queued fairly per user, starts the
+    update's latency trace, and rejects commands from users that are over
+    their rate limit.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def get_handler(self):
+        return TypeHandler(Update, self.run)
+
+    async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        message = update.effective_message
+        if user is None:
+            current_request.set(None)
+            current_trace.set(None)
+            return
+        current_request.set(RequestContext(user.id, message))
+
+        command = "message"
+        if message is not None and message.text and message.text.startswith("/"):
+            command = message.text.split()[0][1:].split("@")[0].lower()
+        trace = RequestTrace(command, user.id)
+        current_trace.set(trace)
+
+        with stage("auth"):
+            # Unauthorized users get their refusal from the command handlers as before
+            if not is_authorized(user.id) or message is None or not message.text:
+                return
+            retry_after = self.limiter.check(user.id, command)
+
+        if retry_after:
+            logger.info(f"User {user.id} is rate limited on {command}.")
+            await message.reply_text(f"Slow down a little 🙂 Try again in {math.ceil(retry_after)} s.")
+            trace.finish("rate_limited")
+            raise ApplicationHandlerStop
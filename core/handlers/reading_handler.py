@@ -1,7 +1,10 @@
 from telegram import Update, ForceReply
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
-from config import AUTHORIZED_USERS, VALID_LEVELS, VOICES
+from config import AUTHORIZED_USERS, VALID_LEVELS, VOICES, READING_TTS_MODE, READING_TTS_CHUNK_WORDS, READING_TTS_CONCURRENCY
+from core.metrics import stage, traced
 from core.utils import generate_random_date_str
+from core.audio_cache import reply_cached_audio, reply_chunked_audio
+from core.streaming import stream_reply
 import logging, random, datetime
 
 
@@ -13,11 +16,13 @@ def is_authorized(user_id: int) -> bool:
 
 
 class ReadingHandler:
-    def __init__(self, openai_client):
+    def __init__(self, openai_client, pool=None, progress=None):
         self.openai = openai_client
+        self.pool = pool
+        self.progress = progress
 
     def get_command_handler(self):
-        return CommandHandler("reading", self.run)
+        return CommandHandler("reading", traced("reading", self.run))
 
     async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
@@ -44,6 +49,51 @@ class ReadingHandler:
 
         context.user_data['reading'] = level
 
+        header = f"Hier is een leestekst op niveau {level} over '{topic}':\n\n"
+
+        try:
+            exercise = None
+            if self.pool and topic == 'today':
+                with stage("pool"):
+                    exercise = self.pool.pop('reading', level)
+
+            # The text goes out first (streamed in on a pool miss), the audio follows
+            audio = None
+            if exercise:
+                reading_text, selected_voice, audio = exercise['text'], exercise['voice'], exercise['audio']
+                with stage("telegram_send"):
+                    await update.message.reply_text(header + reading_text)
+            else:
+                with stage("prompt_build"):
+                    request = self.reading_request(level, topic)
+                chunks = self.openai.stream_chat_completion(**request)
+                reading_text = await stream_reply(update.message, chunks, prefix=header, parse_mode=None)
+                selected_voice = random.choice(VOICES)
+
+            # Save the generated sentence
+            context.user_data['reading_text'] = reading_text
+
+            # Sending an audio file: pooled exercises have theirs ready; with
+            # READING_TTS_MODE chunks or joined long texts are synthesized in chunks
+            if audio or READING_TTS_MODE == "single":
+                await reply_cached_audio(update.message, self.openai, reading_text, selected_voice, audio)
+            else:
+                await reply_chunked_audio(
+                    update.message, self.openai, reading_text, selected_voice,
+                    joined=READING_TTS_MODE == "joined",
+                    max_words=READING_TTS_CHUNK_WORDS,
+                    concurrency=READING_TTS_CONCURRENCY,
+                )
+            if self.progress:
+                self.progress.record_exercise(user.id, 'reading', level, reading_text)
+            logger.info(f"User {update.effective_user.id} started the reading level {level}.")
+
+        except Exception as e:
+            logger.error(f"Error in reading: {e}")
+            await update.message.reply_text("An error occurred while generating the text. Try again.")
+
+    def reading_request(self, level, topic='today'):
+        """Chat completion arguments for a reading text on the level and topic."""
         random_date_str, random_year, current_year = generate_random_date_str()
 
         if topic == "today":
@@ -67,35 +117,27 @@ class ReadingHandler:
         else:
             prompt = f"Schrijf een korte tekst (max 250 woorden) in het Nederlands op niveau {level} over het onderwerp '{topic}'."
 
+        return dict(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a Dutch reading comprehension assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.7,
+            top_p=0.95
+        )
 
-        try:
-            response = self.openai.chat_completion(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a Dutch reading comprehension assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7,
-                top_p=0.95
-            )
-
-            reading_text = response.choices[0].message.content.strip()
-        
-            # Save the generated sentence
-            context.user_data['reading_text'] = reading_text
-            
-            # Select a random voice
-            selected_voice = random.choice(VOICES)
+    async def generate_exercise(self, level, style=None, topic='today'):
+        """Generates a reading text for the level and topic, with its audio."""
+        response = await self.openai.chat_completion(**self.reading_request(level, topic))
 
-            # Generate an audio file using the OpenAI client
-            audio_path = self.openai.generate_audio(reading_text, voice=selected_voice)
+        reading_text = response.choices[0].message.content.strip()
 
-            # Sending an audio file
-            await update.message.reply_audio(audio=open(audio_path, "rb"))
-            await update.message.reply_text(f"Hier is een leestekst op niveau {level} over '{topic}':\n\n" + reading_text)
-            logger.info(f"User {update.effective_user.id} started the reading level {level}.")
+        # Select a random voice
+        selected_voice = random.choice(VOICES)
 
-        except Exception as e:
-            logger.error(f"Error in reading: {e}")
-            await update.message.reply_text("An error occurred while generating the text. Try again.")
+        # Generate the audio now, so sending it later needs no TTS call
+        audio = await self.openai.generate_audio(reading_text, voice=selected_voice)
+
+        return {'text': reading_text, 'voice': selected_voice, 'audio': audio}
@@ -1,6 +1,7 @@
 from telegram import Update, ForceReply
 from telegram.ext import ContextTypes, CommandHandler
 from config import AUTHORIZED_USERS
+from core.metrics import traced
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,8 +13,8 @@ class StartHandler:
     @staticmethod
     def get_handlers():
         return [
-            CommandHandler("start", StartHandler.run_start),
-            CommandHandler("info", StartHandler.run_info),
+            CommandHandler("start", traced("start", StartHandler.run_start)),
+            CommandHandler("info", traced("info", StartHandler.run_info)),
         ]
 
     @staticmethod
@@ -31,6 +32,7 @@ class StartHandler:
             "• /translation — translate short texts\n"
             "• /explain [sentence/rule] — grammar explanation\n\n"
             "• /word — dictionary and examples\n\n"
+            "• /stats — your progress\n\n"
             "For more info about a command, type `/info [command]`.\n"
             "Example: `/info translation`"
         )
@@ -73,6 +75,7 @@ class StartHandler:
                 "covering topics like tijd, datums, geld, telefoonnummers, huisnummers, leeftijden, temperaturen, afstanden, and more."
             ),
             "explain": "🔤 /explain [sentence/rule] — Get a simple grammar explanation or clarification of a Dutch sentence.",
+            "stats": "📊 /stats — See your exercises, average translation score, practiced words and streak.",
         }
 
         message = info_map.get(command, f"Unknown command: {command}")
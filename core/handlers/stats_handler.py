@@ -0,0 +1,67 @@
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from config import AUTHORIZED_USERS
+from core.metrics import traced
+import logging
+
+logger = logging.getLogger(__name__)
+
+def is_authorized(user_id: int) -> bool:
+    return user_id in AUTHORIZED_USERS
+
+MODE_LINES = [
+    ('dictate', "🎧 Dictation"),
+    ('translation', "📝 Translation"),
+    ('reading', "📖 Reading"),
+    ('word', "📚 Word lookups"),
+    ('explain', "🔤 Grammar questions"),
+]
+
+
+class StatsHandler:
+    def __init__(self, progress):
+        self.progress = progress
+
+    def get_command_handler(self):
+        return CommandHandler("stats", traced("stats", self.run))
+
+    @staticmethod
+    def format_stats(stats):
+        user = stats["user"]
+        if not user:
+            return "No exercises yet — try /dictate or /translation to get started!"
+
+        lines = ["📊 Your progress\n"]
+        for mode, title in MODE_LINES:
+            mode_stats = stats["modes"].get(mode)
+            if not mode_stats:
+                continue
+            line = f"{title}: {mode_stats['exercises']} started"
+            if mode_stats["answers"]:
+                line += f", {mode_stats['answers']} answered"
+            if mode_stats["average_score"] is not None:
+                line += f", average score {mode_stats['average_score']:.1f}/10 (best {mode_stats['best_score']:g})"
+            if mode_stats["level"]:
+                line += f" — level {mode_stats['level']}"
+            lines.append(line)
+
+        lines.append("")
+        lines.append(f"🧠 Words practiced: {user['words']}")
+        lines.append(f"📅 Active days: {user['active_days']}")
+        if user["streak"] > 1:
+            lines.append(f"🔥 Streak: {user['streak']} days in a row")
+        return "\n".join(lines)
+
+    async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        user = update.effective_user
+        if not is_authorized(user.id):
+            await update.message.reply_text("Sorry, you don't have access to this bot.")
+            logger.info(f"Unauthorized user {user.id} tried to use the bot.")
+            return
+
+        try:
+            await update.message.reply_text(self.format_stats(self.progress.stats(user.id)))
+            logger.info(f"User {user.id} requested their stats.")
+        except Exception as e:
+            logger.error(f"Error in stats: {e}")
+            await update.message.reply_text("An error occurred while loading your stats. Try again.")
@@ -1,9 +1,13 @@
 from telegram import Update, ForceReply
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
-from config import AUTHORIZED_USERS, WORDS_FILE, VALID_LEVELS, VALID_STYLES
-from core.utils import load_words_from_csv
+from telegram.ext import ContextTypes, CommandHandler
+from config import AUTHORIZED_USERS, VALID_LEVELS, VALID_STYLES, DEDUPE_ATTEMPTS
+from core.metrics import stage, traced
+from core.streaming import stream_reply
+from core.glossary import parse_translations
+from core.progress import parse_score
+from core.prompts import glossary_request
+from core.tasks import gather_partial
 import logging
-import random
 
 logger = logging.getLogger(__name__)
 
@@ -12,16 +16,17 @@ def is_authorized(user_id: int) -> bool:
 
 
 class TranslationHandler:
-    def __init__(self, memory, openai_client):
+    def __init__(self, memory, openai_client, word_bank, pool=None, glossary=None, deduper=None, progress=None):
         self.memory = memory
         self.openai = openai_client
+        self.word_bank = word_bank
+        self.pool = pool
+        self.glossary = glossary
+        self.deduper = deduper
+        self.progress = progress
 
     def get_command_handler(self):
-        return CommandHandler("translation", self.run)
-    
-    def get_message_handler(self):
-        # block=False ensures this handler won't stop other message handlers.
-        return MessageHandler(filters.TEXT & ~filters.COMMAND, self.check_translation, block=False)
+        return CommandHandler("translation", traced("translation", self.run))
 
 
     async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -57,14 +62,38 @@ class TranslationHandler:
         context.user_data['translation_level'] = level
         context.user_data['translation_style'] = style_code
 
+        try:
+            exercise = None
+            if self.pool and topic == 'general':
+                exercise = self.pool.pop('translation', level, style_code)
+            if exercise is None:
+                exercise = await self.generate_exercise(level, style_code, topic, user_id=user.id)
+            self.word_bank.mark_practiced(user.id, exercise['words'])
+
+            text_to_translate = exercise['text']
+            context.user_data['text_to_translate'] = text_to_translate
 
-        word_list = load_words_from_csv(WORDS_FILE)
+            text_to_send= f"💡 The words we are practicing are: {exercise['words_translation']}.\n\n" + text_to_translate
 
-        # Get 3 random words
-        random_words = random.sample(word_list, 3)
+            await update.message.reply_text(
+                f"Oké, laten we vertalen! Translate the following text into Dutch (level {level}, style: {style_code}, topic: '{topic}'):\n\n"
+                f"**{text_to_send}**"
+            )
+            if self.progress:
+                self.progress.record_exercise(user.id, 'translation', level, text_to_translate)
+                self.progress.record_words(user.id, exercise['words'])
+            logger.info(f"User {update.effective_user.id} started a translation task. Level: {level}, Style: {style_code}, Topic: {topic}.")
+        except Exception as e:
+            logger.error(f"Error in translation start: {e}")
+            await update.message.reply_text("An error occurred. Please try again.")
 
-        recent_sentences = self.memory.get_recent_sentences(context.user_data['mode'])
-        
+    async def generate_exercise(self, level, style_code='L', topic='general', user_id=None):
+        """Generates a text to translate plus the translation of the practiced words."""
+        # Get 3 random words the user hasn't practiced recently
+        with stage("memory_read"):
+            random_words = self.word_bank.sample(3, user_id=user_id)
+            # A bounded sample keeps the prompt the same size however long the history is
+            recent_sentences = self.deduper.sample('translation') if self.deduper else []
 
         prompts = {
             'A': (
@@ -111,12 +140,16 @@ class TranslationHandler:
         }
 
         prompt = prompts.get(style_code, prompts['L']) # Default to Learning style for translation
-        
+
         if recent_sentences:
             prompt += f"\n ⚠️ Do not repeat any of these sentences: {recent_sentences}"
 
-        try:
-            response = self.openai.chat_completion(
+        # Known words come from the glossary; the text and the remaining words are generated concurrently
+        known = self.glossary.lookup(random_words) if self.glossary else {}
+        missing = [word for word in random_words if word not in known]
+
+        async def generate_text():
+            response = await self.openai.chat_completion(
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a helpful Dutch language teacher."},
@@ -126,39 +159,54 @@ class TranslationHandler:
                 temperature=0.8,
                 top_p=0.96
             )
-            text_to_translate = response.choices[0].message.content.strip()
-            context.user_data['text_to_translate'] = text_to_translate
+            return response.choices[0].message.content.strip()
 
-            self.memory.add_sentence(context.user_data['mode'], text_to_translate)
-            
-            response = self.openai.chat_completion(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful Dutch language teacher."},
-                    {"role": "user", "content": f"Give translation to English for this words: '{random_words[0]}', '{random_words[1]}', '{random_words[2]}'. use format:  '{random_words[0]}' - translation, '{random_words[1]}' - translation, '{random_words[2]}' - translation, that's all. "}
-                ],
-                max_tokens=50
-            )
-            words_translation = response.choices[0].message.content.strip()
-            text_to_send= f"💡 The words we are practicing are: {words_translation}.\n\n" + text_to_translate
-
-            await update.message.reply_text(
-                f"Oké, laten we vertalen! Translate the following text into Dutch (level {level}, style: {style_code}, topic: '{topic}'):\n\n"
-                f"**{text_to_send}**"
-            )
-            logger.info(f"User {update.effective_user.id} started a translation task. Level: {level}, Style: {style_code}, Topic: {topic}.")
-        except Exception as e:
-            logger.error(f"Error in translation start: {e}")
-            await update.message.reply_text("An error occurred. Please try again.")
+        jobs = {
+            # Regenerates when the text repeats earlier ones
+            'text': self.deduper.generate_unique('translation', generate_text, DEDUPE_ATTEMPTS)
+            if self.deduper else generate_text()
+        }
+        if missing:
+            jobs['words'] = self.translate_words(missing)
+        results = await gather_partial(**jobs)
+
+        if isinstance(results['text'], Exception):
+            raise results['text']
+        text_to_translate = results['text']
+
+        self.memory.add_sentence('translation', text_to_translate)
+
+        translated = dict(known)
+        raw = None
+        if isinstance(results.get('words'), Exception):
+            # The exercise still works without translations of the words
+            logger.warning(f"Word translation failed, sending the words untranslated: {results['words']}")
+        elif 'words' in results:
+            parsed, raw = results['words']
+            translated.update(parsed)
+
+        parts = [f"'{w}' - {translated[w]}" for w in random_words if w in translated]
+        untranslated = [w for w in random_words if w not in translated]
+        if untranslated:
+            # Answer not in the expected format: show it as is
+            parts.append(raw or ", ".join(f"'{w}'" for w in untranslated))
+        words_translation = ", ".join(parts)
+
+        return {'text': text_to_translate, 'words': random_words, 'words_translation': words_translation}
+
+    async def translate_words(self, words):
+        """Asks the model for English translations; returns ({word: translation}, raw answer)."""
+        response = await self.openai.chat_completion(**glossary_request(words))
+        raw = response.choices[0].message.content.strip()
+        parsed = parse_translations(raw, words)
+        if self.glossary:
+            self.glossary.add(parsed)
+        return parsed, raw
 
     async def check_translation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Проверяет перевод, отправленный пользователем."""
+        """Проверяет перевод, отправленный пользователем. Called by the ModeRouter in 'translation' mode."""
         user = update.effective_user
 
-        mode = context.user_data.get("mode")
-        if mode != "translation":
-            return
-
         user_translation = update.message.text.strip()
         original_text = context.user_data.get("text_to_translate")
 
@@ -185,7 +233,7 @@ class TranslationHandler:
                     f"Student's Dutch translation: {user_translation}\n"
                 )
 
-            response = self.openai.chat_completion(
+            chunks = self.openai.stream_chat_completion(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a friendly Dutch teacher."},
@@ -194,9 +242,9 @@ class TranslationHandler:
                 max_tokens=400,
                 temperature=0.5,
             )
-
-            feedback = response.choices[0].message.content.strip()
-            await update.message.reply_text(feedback, parse_mode="Markdown", disable_web_page_preview=True)
+            feedback = await stream_reply(update.message, chunks)
+            if self.progress:
+                self.progress.record_answer(user.id, 'translation', user_translation, parse_score(feedback))
 
         except Exception as e:
             logger.error(f"Error in check_translation: {e}")
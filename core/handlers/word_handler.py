@@ -1,6 +1,10 @@
 from telegram import Update, ForceReply
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from config import AUTHORIZED_USERS
+from core.metrics import stage, traced
+from core.prompts import WORD_PROMPT_VERSION, WORD_MODEL, word_request
+from core.response_cache import normalize_input
+from core.streaming import reply_formatted, stream_reply
 import logging, random
 
 
@@ -12,11 +16,24 @@ def is_authorized(user_id: int) -> bool:
 
 
 class WordHandler:
-    def __init__(self, openai_client):
+    def __init__(self, openai_client, response_cache=None, content_store=None, progress=None):
         self.openai = openai_client
+        self.response_cache = response_cache
+        self.content_store = content_store
+        self.progress = progress
 
     def get_command_handler(self):
-        return CommandHandler("word", self.run)
+        return CommandHandler("word", traced("word", self.run))
+
+    async def lookup(self, word_to_define):
+        """Returns a stored answer: precomputed definitions first, then the response cache."""
+        if self.content_store:
+            precomputed = self.content_store.get('word', normalize_input(word_to_define), WORD_PROMPT_VERSION)
+            if precomputed:
+                return precomputed
+        if self.response_cache:
+            return await self.response_cache.get('word', word_to_define, WORD_PROMPT_VERSION, WORD_MODEL)
+        return None
 
     async def run(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
@@ -30,30 +47,23 @@ class WordHandler:
             word_to_define = 'nietbestaan'
 
         context.user_data['mode'] = 'word'
+        if self.progress:
+            self.progress.record_exercise(user.id, 'word', text=word_to_define)
 
-        prompt = f"""Give a detailed explanation of the Dutch word '{word_to_define}'. Include the following:
-                1. A clear definition in English.
-                2. At least two example sentences in natural Dutch (with English translations).
-                3. A memory aid (mnemonic) or trick to help remember the word. Suggest associations for memorization from English.
+        try:
+            with stage("cache_lookup"):
+                cached = await self.lookup(word_to_define)
+            if cached:
+                await reply_formatted(update.message, cached)
+                logger.info(f"User {update.effective_user.id} got a stored word answer for: {word_to_define}.")
+                return
 
-                Format the answer clearly using section headers for each part.
-                Do not use HTML tags or HTML formatting in your response."""
+            chunks = self.openai.stream_chat_completion(**word_request(word_to_define))
+            word_info = await stream_reply(update.message, chunks)
+            # A fallback model's answer is not cached as WORD_MODEL's
+            if self.response_cache and not chunks.degraded:
+                await self.response_cache.put('word', word_to_define, WORD_PROMPT_VERSION, WORD_MODEL, word_info)
 
-        try:
-            response = self.openai.chat_completion(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful Dutch vocabulary assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.4,
-                top_p=0.9
-            )
-
-            word_info = response.choices[0].message.content.strip()
-
-            await update.message.reply_text(word_info,  parse_mode="Markdown", disable_web_page_preview=True)
             logger.info(f"User {update.effective_user.id} requested word definition for: {word_to_define}.")
 
         except Exception as e:
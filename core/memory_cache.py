@@ -0,0 +1,104 @@
+import asyncio, datetime, logging, threading
+
+logger = logging.getLogger(__name__)
+
+
+class CachedMemoryManager:
+    """
+    Write-behind cache in front of MemoryManager.
+
+    Recent sentences are kept in RAM per mode and date, so reads are dictionary
+    lookups. New sentences are queued and written to storage in one batch by
+    flush(), which runs on a timer and on shutdown. Dates that fall out of the
+    lookback window are evicted during the flush. With `reload`, for storage
+    shared with other bot processes, the windows are read again after every
+    flush instead, in a worker thread, so they pick up the other processes'
+    sentences without handlers waiting on storage.
+    """
+
+    def __init__(self, memory, lookback_days=7, reload=False):
+        self.memory = memory
+        self.lookback_days = lookback_days
+        self.reload = reload
+        self.windows = {}  # mode -> {date: [sentences]}
+        self.pending = []  # (mode, date, sentence) rows not yet on disk
+        self.lock = threading.Lock()
+
+    def _window(self, mode):
+        window = self.windows.get(mode)
+        if window is None:
+            window = {}
+            for date_str, sentence in self.memory.get_recent_by_date(mode, self.lookback_days):
+                window.setdefault(date_str, []).append(sentence)
+            self.windows[mode] = window
+        return window
+
+    def add_sentence(self, mode, sentence):
+        today = str(datetime.date.today())
+        with self.lock:
+            sentences = self._window(mode).setdefault(today, [])
+            if sentence in sentences:
+                return
+            sentences.append(sentence)
+            self.pending.append((mode, today, sentence))
+
+    def get_recent_sentences(self, mode, days=7):
+        if days > self.lookback_days:
+            # Older than what we keep in RAM: write pending rows first, then ask storage.
+            self.flush()
+            return self.memory.get_recent_sentences(mode, days)
+
+        since = str(datetime.date.today() - datetime.timedelta(days=days))
+        with self.lock:
+            window = self._window(mode)
+            return [
+                sentence
+                for date_str in sorted(window)
+                if date_str >= since
+                for sentence in window[date_str]
+            ]
+
+    def evict(self):
+        since = str(datetime.date.today() - datetime.timedelta(days=self.lookback_days))
+        with self.lock:
+            for window in self.windows.values():
+                for date_str in [d for d in window if d < since]:
+                    del window[date_str]
+
+    def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return 0
+        try:
+            self.memory.add_sentences(rows)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(rows)} sentences: {e}")
+            with self.lock:
+                self.pending = rows + self.pending
+            raise
+        return len(rows)
+
+    async def flush_job(self, context=None):
+        """Job-queue callback: writes queued sentences and drops expired days (or reloads the windows)."""
+        await asyncio.to_thread(self.flush)
+        if self.reload:
+            await asyncio.to_thread(self.reload_windows)
+        else:
+            self.evict()
+
+    def reload_windows(self):
+        """Reads the windows of the cached modes from storage again; only days in the lookback are read."""
+        for mode in list(self.windows):
+            window = {}
+            for date_str, sentence in self.memory.get_recent_by_date(mode, self.lookback_days):
+                window.setdefault(date_str, []).append(sentence)
+            with self.lock:
+                # Sentences added since the flush are not in storage yet
+                for pending_mode, date_str, sentence in self.pending:
+                    if pending_mode != mode:
+                        continue
+                    sentences = window.setdefault(date_str, [])
+                    if sentence not in sentences:
+                        sentences.append(sentence)
+                self.windows[mode] = window
@@ -0,0 +1,225 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are kept in one registry (REGISTRY) and
+rendered by render(). Components that already keep their own statistics
+(caches, pool, scheduler) are exposed through collectors instead of being
+rewritten. Per-command latency is recorded with RequestTrace: stages are
+timed with stage(), and finishing the trace logs one JSON line per command.
+"""
+import contextlib, contextvars, json, logging, threading, time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # name -> {labels_key: value}
+        self.gauges = {}
+        self.histograms = {}  # name -> {labels_key: [bucket counts..., sum, count]}
+        self.help = {}
+        self.collectors = []
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            key = _labels_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def add(self, name, value, **labels):
+        with self.lock:
+            series = self.gauges.setdefault(name, {})
+            key = _labels_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            key = _labels_key(labels)
+            data = series.get(key)
+            if data is None:
+                data = series[key] = [0] * len(DEFAULT_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def add_collector(self, collector):
+        """collector() returns an iterable of (name, "counter"|"gauge", labels dict, value)."""
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = [(n, "counter", dict(s)) for n, s in self.counters.items()]
+            families += [(n, "gauge", dict(s)) for n, s in self.gauges.items()]
+            histograms = {n: {k: list(v) for k, v in s.items()} for n, s in self.histograms.items()}
+
+        collected = {}
+        for collector in self.collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    if value is None:
+                        continue
+                    collected.setdefault((name, kind), {})[_labels_key(labels)] = value
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+        families += [(name, kind, series) for (name, kind), series in collected.items()]
+
+        for name, kind, series in families:
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        for name, series in histograms.items():
+            if name in self.help:
+                lines.append(f"# HELP {name} {self.help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, data in series.items():
+                for bound, count in zip(DEFAULT_BUCKETS, data):
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', str(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {data[-1]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {data[-2]}")
+                lines.append(f"{name}_count{_format_labels(key)} {data[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REGISTRY.describe("bot_command_seconds", "Total handling time per command")
+REGISTRY.describe("bot_stage_seconds", "Time spent per command stage")
+REGISTRY.describe("bot_commands_in_flight", "Commands currently being handled")
+REGISTRY.describe("openai_request_seconds", "Latency of OpenAI requests, retries included")
+REGISTRY.describe("openai_tokens_total", "Tokens reported in response.usage")
+REGISTRY.describe("exercise_pool_refill_seconds", "Time to produce one pooled exercise")
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+
+
+class RequestTrace:
+    """Timings of one command, from the gate handler to the end of its callback."""
+
+    def __init__(self, command, user_id):
+        self.command = command
+        self.user_id = user_id
+        self.started = time.monotonic()
+        self.stages = {}
+        self.finished = False
+
+    def record(self, stage_name, seconds):
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+        REGISTRY.observe("bot_stage_seconds", seconds, command=self.command, stage=stage_name)
+
+    def finish(self, outcome="ok"):
+        if self.finished:
+            return
+        self.finished = True
+        total = time.monotonic() - self.started
+        REGISTRY.observe("bot_command_seconds", total, command=self.command)
+        REGISTRY.inc("bot_commands_total", command=self.command, outcome=outcome)
+        logger.info(json.dumps({
+            "event": "command",
+            "command": self.command,
+            "user": self.user_id,
+            "outcome": outcome,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {name: round(s * 1000, 1) for name, s in self.stages.items()},
+        }))
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_stage(name, seconds):
+    """Adds seconds to a stage of the current command, if there is one."""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.record(name, seconds)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times a block as a stage of the current command."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        record_stage(name, time.monotonic() - started)
+
+
+def traced(command, callback):
+    """
+    Wraps a handler callback so its command is counted as in flight while it
+    runs and its trace (started by the gate handler, if any) is finished when
+    it returns.
+    """
+    async def wrapper(update, context):
+        trace = current_trace.get()
+        if trace is None or trace.finished:
+            user = update.effective_user
+            trace = RequestTrace(command, user.id if user else None)
+            current_trace.set(trace)
+        else:
+            trace.command = command
+        outcome = "ok"
+        REGISTRY.add("bot_commands_in_flight", 1, command=command)
+        try:
+            return await callback(update, context)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            REGISTRY.add("bot_commands_in_flight", -1, command=command)
+            trace.finish(outcome)
+    return wrapper
+
+
+async def handle_metrics(request):
+    from aiohttp import web
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
+
+
+class MetricsServer:
+    """Standalone /metrics endpoint, for polling mode (the webhook server serves its own)."""
+
+    def __init__(self, port, host="0.0.0.0"):
+        self.port = port
+        self.host = host
+        self.runner = None
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Metrics on {self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
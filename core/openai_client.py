@@ -1,30 +1,228 @@
-import openai, logging, tempfile
-from config import OPENAI_API_KEY
+import openai, logging, collections, json, time
+import httpx
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MAX_CONCURRENCY, OPENAI_TIMEOUT, TTS_MODEL, TTS_FORMAT, TTS_SPOOL_MAX_BYTES,
+    OPENAI_DEADLINE, OPENAI_TTS_DEADLINE, OPENAI_MAX_RETRIES, OPENAI_RETRY_BASE_DELAY,
+    OPENAI_RETRY_MAX_DELAY, OPENAI_FALLBACK_MODEL, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS,
+)
+from core.audio_cache import AudioCache, AudioClip
+from core import metrics
+from core.rate_limit import FairScheduler
+from core.resilience import CircuitBreaker, CircuitOpenError, call_with_retries, is_retryable
 
 logger = logging.getLogger(__name__)
 
+
+class ChatStream:
+    """
+    The text of a streamed answer, piece by piece (async iterable). Once the
+    stream is open `model` is the model that answers; `degraded` tells that
+    it is the fallback model, whose answers should not be cached as the
+    requested model's.
+    """
+
+    def __init__(self, requested_model):
+        self.requested_model = requested_model
+        self.model = None
+        self.pieces = None
+
+    @property
+    def degraded(self):
+        return self.model is not None and self.model != self.requested_model
+
+    def __aiter__(self):
+        return self.pieces
+
+
 class OpenAIClient:
-    def __init__(self):
-        openai.api_key = OPENAI_API_KEY
-        self.client = openai
-
-    def chat_completion(self, messages, model="gpt-4o", **kwargs):
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
+    def __init__(self, audio_cache, scheduler=None):
+        # One pooled HTTP client shared by every request, so connections are reused
+        # instead of re-opened for each handler call.
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONCURRENCY,
+                max_keepalive_connections=OPENAI_MAX_CONCURRENCY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=10.0),
+        )
+        # Retries are done by call_with_retries, not by the SDK
+        self.client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, http_client=self.http_client, max_retries=0
+        )
+        # Caps the number of in-flight OpenAI calls across all users, serving waiting users in turn.
+        self.scheduler = scheduler or FairScheduler(OPENAI_MAX_CONCURRENCY)
+        self.audio_cache = audio_cache
+        self.breakers = collections.defaultdict(
+            lambda: CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        )  # model -> breaker
+        self.outcomes = collections.Counter()
+
+    async def _call(self, fn, model, deadline, fallback=True):
+        """
+        Runs fn(model) with retries under the model's circuit breaker. If the
+        model is unavailable (breaker open or retries exhausted), tries the
+        fallback model once. Returns fn's result and the model that produced it.
+        """
+        models = [model]
+        if fallback and OPENAI_FALLBACK_MODEL and OPENAI_FALLBACK_MODEL != model:
+            models.append(OPENAI_FALLBACK_MODEL)
+
+        for i, current in enumerate(models):
+            try:
+                result = await call_with_retries(
+                    lambda: fn(current), self.breakers[current], self.outcomes, deadline,
+                    OPENAI_MAX_RETRIES, OPENAI_RETRY_BASE_DELAY, OPENAI_RETRY_MAX_DELAY,
+                )
+                return result, current
+            except Exception as e:
+                degraded = isinstance(e, CircuitOpenError) or is_retryable(e)
+                if not degraded or i == len(models) - 1:
+                    logger.error(f"OpenAI API error ({current}): {e}")
+                    raise
+                self.outcomes["fallback"] += 1
+                logger.warning(f"{current} unavailable ({e}), falling back to {models[i + 1]}.")
+
+    @staticmethod
+    def _record_usage(model, usage):
+        if usage is None:
+            return
+        metrics.inc("openai_tokens_total", usage.prompt_tokens or 0, model=model, type="prompt")
+        metrics.inc("openai_tokens_total", usage.completion_tokens or 0, model=model, type="completion")
+
+    @staticmethod
+    def _record_latency(kind, model, started):
+        seconds = time.monotonic() - started
+        metrics.observe("openai_request_seconds", seconds, kind=kind, model=model)
+        metrics.record_stage(f"openai_{kind}", seconds)
+
+    async def chat_completion(self, messages, model="gpt-4o", deadline=OPENAI_DEADLINE, fallback=True, **kwargs):
+        """
+        One answer from the model. Pass fallback=False when the answer is
+        stored as this model's: the fallback model then never answers instead.
+        """
+        async def create(current_model):
+            return await self.client.chat.completions.create(
+                model=current_model,
+                messages=messages,
+                **kwargs
+            )
+        # The slot is taken before the deadline and the circuit breaker see the call: waiting
+        # for it is local congestion, not an OpenAI failure
+        async with self.scheduler.slot():
+            started = time.monotonic()
+            try:
+                response, _ = await self._call(create, model, deadline, fallback)
+            finally:
+                self._record_latency("chat", model, started)
+        self._record_usage(getattr(response, "model", None) or model, getattr(response, "usage", None))
+        return response
+
+    def stream_chat_completion(self, messages, model="gpt-4o", deadline=OPENAI_DEADLINE, **kwargs):
+        """
+        Returns a ChatStream of the answer text, piece by piece as the model
+        produces it. Retries and fallback apply until the stream is open; a
+        stream that breaks off midway raises.
+        """
+        answer = ChatStream(model)
+        answer.pieces = self._stream_pieces(answer, messages, model, deadline, **kwargs)
+        return answer
+
+    async def _stream_pieces(self, answer, messages, model, deadline, **kwargs):
+        async def open_stream(current_model):
+            return await self.client.chat.completions.create(
+                model=current_model,
                 messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
                 **kwargs
             )
-            return response
-        except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
-            raise
-    def generate_audio(self, text, voice="alloy"):
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmpfile:
-            with self.client.audio.speech.with_streaming_response.create(
-                model="gpt-4o-mini-tts",
-                voice=voice,
-                input=text
-            ) as response:
-                response.stream_to_file(tmpfile.name)
-            return tmpfile.name
+
+        async with self.scheduler.slot():
+            started = time.monotonic()
+            first_token = True
+            try:
+                stream, answer.model = await self._call(open_stream, model, deadline)
+                async with stream:
+                    async for chunk in stream:
+                        if chunk.usage:
+                            # Sent as a last chunk without choices
+                            self._record_usage(chunk.model or model, chunk.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            if first_token:
+                                first_token = False
+                                metrics.record_stage("openai_first_token", time.monotonic() - started)
+                            yield chunk.choices[0].delta.content
+            finally:
+                self._record_latency("stream", model, started)
+
+    def audio_key(self, text, voice):
+        return AudioCache.key(text, voice, TTS_MODEL, TTS_FORMAT)
+
+    async def generate_audio(self, text, voice="alloy"):
+        """
+        Returns an AudioClip of the text in TTS_FORMAT: streamed from TTS into
+        memory, or read from the disk cache when it is enabled and has it.
+        """
+        key = self.audio_key(text, voice)
+        cached_path = self.audio_cache.get(key)
+        if cached_path:
+            metrics.inc("audio_cache_total", result="disk")
+            return AudioClip.from_path(cached_path, TTS_FORMAT, TTS_SPOOL_MAX_BYTES)
+        metrics.inc("audio_cache_total", result="miss")
+
+        async def synthesize(model):
+            clip = AudioClip(TTS_FORMAT, TTS_SPOOL_MAX_BYTES)
+            try:
+                async with self.client.audio.speech.with_streaming_response.create(
+                    model=model,
+                    voice=voice,
+                    input=text,
+                    response_format=TTS_FORMAT,
+                ) as response:
+                    async for chunk in response.iter_bytes():
+                        clip.write(chunk)
+            except BaseException:
+                clip.close()
+                raise
+            return clip
+
+        async with self.scheduler.slot():
+            started = time.monotonic()
+            try:
+                clip, _ = await self._call(synthesize, TTS_MODEL, OPENAI_TTS_DEADLINE, fallback=False)
+                return clip
+            finally:
+                self._record_latency("tts", TTS_MODEL, started)
+
+    async def submit_batch(self, requests, endpoint="/v1/chat/completions"):
+        """
+        Uploads request lines ({"custom_id", "method", "url", "body"}) as JSONL
+        and starts a Batch API job on them; returns the batch id. Batches are
+        cheaper than single calls and run outside the interactive rate limits,
+        but take up to 24 hours.
+        """
+        data = "\n".join(json.dumps(request, ensure_ascii=False) for request in requests).encode("utf-8")
+        input_file = await self.client.files.create(file=("batch.jsonl", data), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id, endpoint=endpoint, completion_window="24h"
+        )
+        return batch.id
+
+    async def get_batch(self, batch_id):
+        """Returns (status, output_file_id, error_file_id) of a batch."""
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status, batch.output_file_id, batch.error_file_id
+
+    async def batch_results(self, file_id):
+        """The result lines ({"custom_id", "response", "error"}) of a batch output or error file."""
+        content = await self.client.files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    def metrics(self):
+        return {
+            "outcomes": dict(self.outcomes),
+            "circuits": {model: breaker.state for model, breaker in self.breakers.items()},
+        }
+
+    async def close(self):
+        await self.client.close()
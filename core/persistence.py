@@ -0,0 +1,183 @@
+import json, logging, pickle, threading, time, uuid
+from telegram.ext import BasePersistence, PersistenceInput
+from core.storage import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+class UserDataPersistence(BasePersistence):
+    """Base of the persistences below: only context.user_data is stored."""
+
+    def __init__(self, update_interval):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+
+    async def get_user_data(self):
+        return {}
+
+    async def flush(self):
+        # Every update_user_data() call is already written
+        pass
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def update_conversation(self, name, key, new_state):
+        pass
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+
+class SQLitePersistence(UserDataPersistence):
+    """
+    Keeps context.user_data (exercise in progress, mode, levels) in SQLite so
+    it survives restarts, pickled per user like PicklePersistence does.
+
+    Writes are batched by the Application: every `update_interval` seconds it
+    hands over the user_data of the users that had updates since the last
+    time, instead of writing after every update.
+
+    Users are loaded lazily: get_user_data() returns nothing at startup, and
+    refresh_user_data(), which the Application calls before handling each
+    update, fills a user's dict from the database the first time that user
+    shows up. State untouched for `max_age` seconds is deleted at startup.
+    """
+
+    def __init__(self, path, update_interval=30, max_age=30 * 24 * 3600):
+        super().__init__(update_interval)
+        self.path = path
+        self.max_age = max_age
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        self.loaded = set()  # users whose state was read in this process
+        with self.lock:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS user_data (
+                    user_id INTEGER PRIMARY KEY,
+                    data BLOB NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+            if max_age:
+                removed = self.conn.execute(
+                    "DELETE FROM user_data WHERE updated < ?", (time.time() - max_age,)
+                ).rowcount
+                if removed:
+                    logger.info(f"Dropped the saved state of {removed} inactive users.")
+
+    async def refresh_user_data(self, user_id, user_data):
+        if user_id in self.loaded:
+            return
+        self.loaded.add(user_id)
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return
+        try:
+            saved = pickle.loads(row[0])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable saved state of user {user_id}: {e}")
+            return
+        # Keys set by this update's earlier handlers win over the saved ones
+        for key, value in saved.items():
+            user_data.setdefault(key, value)
+
+    async def update_user_data(self, user_id, data):
+        self.loaded.add(user_id)
+        blob = pickle.dumps(dict(data), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO user_data (user_id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                (user_id, blob, time.time()),
+            )
+
+    async def drop_user_data(self, user_id):
+        self.loaded.discard(user_id)
+        with self.lock:
+            self.conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class StorePersistence(UserDataPersistence):
+    """
+    user_data in a shared store (see core/shared_store.py), for running
+    several bot processes. Unlike SQLitePersistence, a user's dict is read
+    again before each of their updates whenever another process saved a
+    newer version, so it is current wherever the update lands. The
+    UserOrderedUpdateProcessor writes it back right after the update.
+
+    The dict is stored as JSON, never pickled: whoever can write to the
+    store must not be able to run code in the bot processes.
+    """
+
+    def __init__(self, store, update_interval=30, max_age=30 * 24 * 3600):
+        super().__init__(update_interval)
+        self.store = store
+        self.max_age = max_age
+        self.versions = {}  # user id -> version of the user's dict held in this process
+
+    async def refresh_user_data(self, user_id, user_data):
+        raw = await self.store.get(f"user_data:{user_id}")
+        if raw is None:
+            return
+        try:
+            blob = json.loads(raw)
+            version, saved = blob["version"], blob["data"]
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable saved state of user {user_id}: {e}")
+            return
+        if self.versions.get(user_id) == version:
+            return
+        self.versions[user_id] = version
+        user_data.clear()
+        user_data.update(saved)
+
+    async def update_user_data(self, user_id, data):
+        version = uuid.uuid4().hex
+        try:
+            blob = json.dumps({"version": version, "data": data}, ensure_ascii=False)
+        except TypeError as e:
+            logger.error(f"Not saving the state of user {user_id}: {e}")
+            return
+        await self.store.set(f"user_data:{user_id}", blob, ttl=self.max_age)
+        self.versions[user_id] = version
+
+    async def drop_user_data(self, user_id):
+        self.versions.pop(user_id, None)
+        await self.store.delete(f"user_data:{user_id}")
+
+    def close(self):
+        pass
@@ -0,0 +1,80 @@
+"""
+Offline jobs that generate content ahead of time.
+
+    python -m core.precompute words [--concurrency 4] [--limit N] [--db PATH] [--dry-run]
+
+`words` stores a /word definition for every word of the frequency list in the
+content store, which /word reads before calling the API. The store doubles as
+the checkpoint: words already stored for the current prompt version are
+skipped, so an interrupted run continues where it stopped. --dry-run uses a
+fake client (no network) and, unless --db is given, an in-memory store.
+"""
+import argparse, asyncio, logging, time
+from config import CONTENT_DB, WORDS_FILE
+from core.content_store import ContentStore
+from core.prompts import WORD_PROMPT_VERSION, WORD_MODEL, word_request
+from core.response_cache import normalize_input
+from core.utils import load_words_from_csv
+
+logger = logging.getLogger(__name__)
+
+
+async def precompute_words(client, store, words, concurrency=4):
+    """Generates and stores definitions for the words that are not stored yet."""
+    done = store.keys('word', WORD_PROMPT_VERSION)
+    todo = list(dict.fromkeys(w for w in words if normalize_input(w) not in done))
+    logger.info(f"{len(words) - len(todo)} words already stored, {len(todo)} to generate.")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"stored": 0, "failed": 0}
+    started = time.monotonic()
+
+    async def generate(word):
+        async with semaphore:
+            try:
+                # No fallback model: its definitions would be stored as WORD_MODEL's for good
+                response = await client.chat_completion(**word_request(word), fallback=False)
+            except Exception as e:
+                stats["failed"] += 1
+                logger.error(f"Failed to define '{word}': {e}")
+                return
+        store.put('word', normalize_input(word), response.choices[0].message.content.strip(),
+                  WORD_PROMPT_VERSION, WORD_MODEL)
+        stats["stored"] += 1
+        if stats["stored"] % 100 == 0:
+            logger.info(f"{stats['stored']}/{len(todo)} words stored ({time.monotonic() - started:.0f}s).")
+
+    await asyncio.gather(*(generate(word) for word in todo))
+    logger.info(f"Done: {stats['stored']} stored, {stats['failed']} failed in {time.monotonic() - started:.1f}s.")
+    return stats
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.precompute")
+    parser.add_argument("job", choices=["words"])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="only the first N words")
+    parser.add_argument("--db", default=None, help=f"content store path (default {CONTENT_DB})")
+    parser.add_argument("--dry-run", action="store_true", help="use a fake OpenAI client, no network")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        from core.fake_openai import FakeOpenAIClient
+        client = FakeOpenAIClient()
+        store = ContentStore(args.db or ":memory:")
+    else:
+        from core.openai_client import OpenAIClient
+        client = OpenAIClient(audio_cache=None)
+        store = ContentStore(args.db or CONTENT_DB)
+
+    words = load_words_from_csv(WORDS_FILE)[:args.limit]
+    try:
+        return await precompute_words(client, store, words, args.concurrency)
+    finally:
+        await client.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(main())
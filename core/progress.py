@@ -0,0 +1,260 @@
+import datetime, logging, os, re, sqlite3, threading, time
+from core.storage import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    mode TEXT NOT NULL,
+    kind TEXT NOT NULL,          -- 'exercise' or 'answer'
+    level TEXT,
+    text TEXT,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_user_at ON events (user_id, at);
+
+CREATE TABLE IF NOT EXISTS words (
+    user_id INTEGER NOT NULL,
+    word TEXT NOT NULL,
+    times INTEGER NOT NULL,
+    last_at REAL NOT NULL,
+    PRIMARY KEY (user_id, word)
+);
+
+-- Aggregates, updated together with every event so /stats reads one row per mode
+CREATE TABLE IF NOT EXISTS mode_stats (
+    user_id INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    exercises INTEGER NOT NULL DEFAULT 0,
+    answers INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    score_count INTEGER NOT NULL DEFAULT 0,
+    best_score REAL,
+    level TEXT,
+    last_at REAL,
+    PRIMARY KEY (user_id, mode)
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL,
+    last_day TEXT NOT NULL,
+    active_days INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    words INTEGER NOT NULL DEFAULT 0
+);
+
+-- Settings of the whole store; only the first shard's table is used
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+SHARD_FILE_PATTERN = re.compile(r"progress-(\d+)\.db$")
+
+SCORE_PATTERN = re.compile(r"Score:\**\s*(\d+(?:[.,]\d+)?)")
+
+
+def parse_score(feedback):
+    """Extracts N from a '⭐ **Score:** N' line of model feedback, or None."""
+    match = SCORE_PATTERN.search(feedback or "")
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "."))
+
+
+class ProgressShard:
+    def __init__(self, path):
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+
+
+class ProgressStore:
+    """
+    Per-user learning progress: exercise and answer history, scores, levels
+    and practiced words. Users are spread over `shards` SQLite files by user
+    id, so writes of different users rarely wait on the same lock or file,
+    and every query touches only the user's own shard through a (user_id, ...)
+    index. Per-mode and per-user aggregates are updated in the same
+    transaction as each event.
+
+    Progress is best-effort: a failed write is logged, never raised, so it
+    cannot break the exercise it belongs to.
+    """
+
+    def __init__(self, directory, shards=8):
+        os.makedirs(directory, exist_ok=True)
+        # Counted before any file is created: stores from before the count was recorded are told by their files
+        files = [SHARD_FILE_PATTERN.match(name) for name in os.listdir(directory)]
+        existing = max((int(m.group(1)) + 1 for m in files if m), default=0)
+        first = ProgressShard(os.path.join(directory, "progress-0.db"))
+        self._check_shard_count(first, shards, existing)
+        self.shards = [first] + [ProgressShard(os.path.join(directory, f"progress-{i}.db")) for i in range(1, shards)]
+
+    @staticmethod
+    def _check_shard_count(first, shards, existing):
+        """A user's shard is user_id % shards, so another count would lose every user's history."""
+        with first.lock:
+            row = first.conn.execute("SELECT value FROM meta WHERE key = 'shards'").fetchone()
+            stored = int(row[0]) if row else existing
+            if stored and stored != shards:
+                raise RuntimeError(
+                    f"Progress is stored in {stored} shards, but PROGRESS_SHARDS is {shards}. "
+                    f"Set PROGRESS_SHARDS={stored}, or move the progress to a new PROGRESS_DIR first."
+                )
+            if row is None:
+                first.conn.execute("INSERT INTO meta (key, value) VALUES ('shards', ?)", (str(shards),))
+
+    def _shard(self, user_id):
+        return self.shards[user_id % len(self.shards)]
+
+    def _write(self, user_id, write):
+        shard = self._shard(user_id)
+        now = time.time()
+        try:
+            with shard.lock:
+                shard.conn.execute("BEGIN")
+                try:
+                    self._touch_user(shard.conn, user_id, now)
+                    write(shard.conn, now)
+                    shard.conn.execute("COMMIT")
+                except BaseException:
+                    shard.conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.error(f"Failed to record progress of user {user_id}: {e}")
+
+    @staticmethod
+    def _touch_user(conn, user_id, now):
+        today = datetime.date.fromtimestamp(now)
+        yesterday = str(today - datetime.timedelta(days=1))
+        conn.execute(
+            """
+            INSERT INTO users (user_id, first_at, last_at, last_day, active_days, streak)
+            VALUES (?, ?, ?, ?, 1, 1)
+            ON CONFLICT (user_id) DO UPDATE SET
+                last_at = excluded.last_at,
+                active_days = active_days + (last_day != excluded.last_day),
+                streak = CASE
+                    WHEN last_day = excluded.last_day THEN streak
+                    WHEN last_day = ? THEN streak + 1
+                    ELSE 1 END,
+                last_day = excluded.last_day
+            """,
+            (user_id, now, now, str(today), yesterday),
+        )
+
+    def record_exercise(self, user_id, mode, level=None, text=None):
+        def write(conn, now):
+            conn.execute(
+                "INSERT INTO events (user_id, at, mode, kind, level, text) VALUES (?, ?, ?, 'exercise', ?, ?)",
+                (user_id, now, mode, level, text),
+            )
+            conn.execute(
+                """
+                INSERT INTO mode_stats (user_id, mode, exercises, level, last_at) VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT (user_id, mode) DO UPDATE SET
+                    exercises = exercises + 1,
+                    level = COALESCE(excluded.level, level),
+                    last_at = excluded.last_at
+                """,
+                (user_id, mode, level, now),
+            )
+        self._write(user_id, write)
+
+    def record_answer(self, user_id, mode, text=None, score=None):
+        def write(conn, now):
+            conn.execute(
+                "INSERT INTO events (user_id, at, mode, kind, text, score) VALUES (?, ?, ?, 'answer', ?, ?)",
+                (user_id, now, mode, text, score),
+            )
+            conn.execute(
+                """
+                INSERT INTO mode_stats (user_id, mode, answers, score_sum, score_count, best_score, last_at)
+                VALUES (:user_id, :mode, 1, COALESCE(:score, 0), :score IS NOT NULL, :score, :now)
+                ON CONFLICT (user_id, mode) DO UPDATE SET
+                    answers = answers + 1,
+                    score_sum = score_sum + COALESCE(:score, 0),
+                    score_count = score_count + (:score IS NOT NULL),
+                    best_score = MAX(COALESCE(best_score, :score), COALESCE(:score, best_score)),
+                    last_at = :now
+                """,
+                {"user_id": user_id, "mode": mode, "score": score, "now": now},
+            )
+        self._write(user_id, write)
+
+    def record_words(self, user_id, words):
+        def write(conn, now):
+            new_words = 0
+            for word in words:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO words (user_id, word, times, last_at) VALUES (?, ?, 1, ?)",
+                    (user_id, word, now),
+                )
+                if cursor.rowcount:
+                    new_words += 1
+                else:
+                    conn.execute(
+                        "UPDATE words SET times = times + 1, last_at = ? WHERE user_id = ? AND word = ?",
+                        (now, user_id, word),
+                    )
+            conn.execute("UPDATE users SET words = words + ? WHERE user_id = ?", (new_words, user_id))
+        self._write(user_id, write)
+
+    def history(self, user_id, since=None, until=None, mode=None, limit=50):
+        """The user's events between two Unix times, newest first, as dicts."""
+        query = "SELECT at, mode, kind, level, text, score FROM events WHERE user_id = ? AND at >= ? AND at < ?"
+        params = [user_id, since or 0, until or float("inf")]
+        if mode:
+            query += " AND mode = ?"
+            params.append(mode)
+        query += " ORDER BY at DESC LIMIT ?"
+        params.append(limit)
+        shard = self._shard(user_id)
+        with shard.lock:
+            rows = shard.conn.execute(query, params).fetchall()
+        return [dict(zip(("at", "mode", "kind", "level", "text", "score"), row)) for row in rows]
+
+    def stats(self, user_id):
+        """Aggregates of one user: {'user': {...} or None, 'modes': {mode: {...}}}."""
+        shard = self._shard(user_id)
+        with shard.lock:
+            user = shard.conn.execute(
+                "SELECT first_at, last_at, active_days, streak, words, last_day FROM users WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+            modes = shard.conn.execute(
+                "SELECT mode, exercises, answers, score_sum, score_count, best_score, level "
+                "FROM mode_stats WHERE user_id = ?",
+                (user_id,),
+            ).fetchall()
+        result = {"user": None, "modes": {}}
+        if user:
+            first_at, last_at, active_days, streak, words, last_day = user
+            # A streak ends once a whole day passes without exercises
+            if last_day < str(datetime.date.today() - datetime.timedelta(days=1)):
+                streak = 0
+            result["user"] = {
+                "first_at": first_at, "last_at": last_at, "active_days": active_days,
+                "streak": streak, "words": words,
+            }
+        for mode, exercises, answers, score_sum, score_count, best_score, level in modes:
+            result["modes"][mode] = {
+                "exercises": exercises,
+                "answers": answers,
+                "average_score": score_sum / score_count if score_count else None,
+                "best_score": best_score,
+                "level": level,
+            }
+        return result
+
+    def close(self):
+        for shard in self.shards:
+            with shard.lock:
+                shard.conn.close()
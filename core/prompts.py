@@ -0,0 +1,46 @@
+"""
+Prompts shared between the handlers and the offline jobs that generate content
+ahead of time, so both produce the same answers.
+"""
+
+# Bump when the prompt below changes, so cached answers from the old prompt are not reused
+WORD_PROMPT_VERSION = 1
+WORD_MODEL = "gpt-4o"
+
+
+def word_request(word_to_define):
+    """Chat completion arguments for the /word definition of a Dutch word."""
+    prompt = f"""Give a detailed explanation of the Dutch word '{word_to_define}'. Include the following:
+                1. A clear definition in English.
+                2. At least two example sentences in natural Dutch (with English translations).
+                3. A memory aid (mnemonic) or trick to help remember the word. Suggest associations for memorization from English.
+
+                Format the answer clearly using section headers for each part.
+                Do not use HTML tags or HTML formatting in your response."""
+    return {
+        "model": WORD_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful Dutch vocabulary assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 500,
+        "temperature": 0.4,
+        "top_p": 0.9,
+    }
+
+
+GLOSSARY_MODEL = "gpt-4o"
+
+
+def glossary_request(words):
+    """Chat completion arguments for the English translations of Dutch words, answered as "'w' - translation"."""
+    quoted = ", ".join(f"'{w}'" for w in words)
+    answer_format = ", ".join(f"'{w}' - translation" for w in words)
+    return {
+        "model": GLOSSARY_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a helpful Dutch language teacher."},
+            {"role": "user", "content": f"Give translation to English for this words: {quoted}. use format:  {answer_format}, that's all. "}
+        ],
+        "max_tokens": max(50, 15 * len(words)),
+    }
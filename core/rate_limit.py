@@ -0,0 +1,176 @@
+import asyncio, collections, contextlib, contextvars, logging, time
+
+logger = logging.getLogger(__name__)
+
+
+def parse_limits(spec):
+    """Parses "reading:3/60,default:20/60" into {"reading": (3, 60.0), "default": (20, 60.0)}."""
+    limits = {}
+    for item in spec.split(","):
+        if ":" not in item or "/" not in item:
+            continue
+        name, rate = item.split(":", 1)
+        count, seconds = rate.split("/", 1)
+        limits[name.strip().lower()] = (int(count), float(seconds))
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_seconds):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds  # tokens added per second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Takes a token. Returns 0 if allowed, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per (user, command). Commands without their own limit use 'default'."""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.buckets = {}
+        self.rejected = collections.Counter()
+
+    def check(self, user_id, command):
+        limit = self.limits.get(command) or self.limits.get("default")
+        if not limit:
+            return 0
+        key = (user_id, command)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(*limit)
+        retry_after = bucket.take()
+        if retry_after:
+            self.rejected[command] += 1
+        return retry_after
+
+
+class RequestContext:
+    """The user an OpenAI call is made for, and where to tell them they are queued."""
+
+    def __init__(self, user_id, message=None):
+        self.user_id = user_id
+        self.message = message
+        self.notified = False
+
+    async def notify_queued(self, position):
+        # One notice per command is enough, even if it makes several model calls
+        if self.notified or self.message is None:
+            return
+        self.notified = True
+        try:
+            await self.message.reply_text(f"⏳ Busy right now — you're queued, position {position}.")
+        except Exception as e:
+            logger.warning(f"Could not send queue notice: {e}")
+
+
+# Set per update by the gate handler; read by OpenAIClient to queue calls per user
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class FairScheduler:
+    """
+    Global concurrency cap for model calls with a round-robin wait queue:
+    when a slot frees up it goes to the next *user* in turn, not the next call,
+    so one user with many calls cannot push everyone else back.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiters = {}  # user_id -> deque of futures
+        self.turns = collections.deque()  # users with waiting calls, in serving order
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queue_depth(self):
+        return sum(len(q) for q in self.waiters.values())
+
+    def _position(self, user_id):
+        """Approximate place in line of the user's newest waiting call under round-robin."""
+        rounds = len(self.waiters[user_id])
+        return sum(min(len(q), rounds) for q in self.waiters.values())
+
+    async def acquire(self, user_id, on_queued=None):
+        if self.active < self.limit and not self.turns:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters.setdefault(user_id, collections.deque())
+        if not queue:
+            self.turns.append(user_id)
+        queue.append(future)
+        started = time.monotonic()
+        try:
+            if on_queued:
+                await on_queued(self._position(user_id))
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on
+                self.release()
+            else:
+                self._forget(user_id, future)
+            raise
+        waited = time.monotonic() - started
+        self.waited += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def _forget(self, user_id, future):
+        queue = self.waiters.get(user_id)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self.waiters[user_id]
+                self.turns.remove(user_id)
+
+    def release(self):
+        while self.turns:
+            user_id = self.turns.popleft()
+            queue = self.waiters[user_id]
+            future = queue.popleft()
+            if queue:
+                self.turns.append(user_id)
+            else:
+                del self.waiters[user_id]
+            if not future.done():
+                # The slot moves straight to the waiter, `active` stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Holds one slot for the user of the current request (see current_request)."""
+        request = current_request.get()
+        user_id = request.user_id if request else None
+        await self.acquire(user_id, request.notify_queued if request else None)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self):
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "queue_depth": self.queue_depth,
+            "queued_users": len(self.turns),
+            "waited": self.waited,
+            "wait_seconds_avg": self.wait_seconds_total / self.waited if self.waited else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
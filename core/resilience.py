@@ -0,0 +1,143 @@
+import asyncio, email.utils, logging, random, time
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and then fails fast
+    for `reset_timeout` seconds. After that one trial call is let through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def release(self):
+        """Ends a call that neither succeeded nor failed (it was cancelled), so another one can be the trial."""
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Circuit opened after {self.failures} consecutive failures.")
+            self.opened_at = time.monotonic()
+
+
+def is_retryable(error):
+    """Timeouts, connection problems, 429 and 5xx are worth another try; 4xx are not."""
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error):
+    """Delay requested by the server through Retry-After(-ms), if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def outcome_of(error):
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+        return "timeout"
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limited"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection_error"
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return "server_error"
+    return "error"
+
+
+async def call_with_retries(fn, breaker, counters, deadline, max_retries, base_delay, max_delay):
+    """
+    Calls fn() with exponential backoff and full jitter on retryable errors.
+    Every attempt must finish within what is left of `deadline` seconds; a
+    Retry-After header overrides the computed delay. Outcomes are counted
+    in `counters`.
+    """
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            counters["circuit_open"] += 1
+            raise CircuitOpenError("circuit breaker is open")
+        remaining = deadline - (time.monotonic() - started)
+        try:
+            result = await asyncio.wait_for(fn(), timeout=max(remaining, 0.001))
+        except Exception as e:
+            retryable = is_retryable(e)
+            counters[outcome_of(e)] += 1
+            if retryable:
+                breaker.record_failure()
+            else:
+                # The service answered; the request itself was bad
+                breaker.record_success()
+            if not retryable or attempt >= max_retries:
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if time.monotonic() - started + delay >= deadline:
+                raise
+            attempt += 1
+            counters["retry"] += 1
+            logger.warning(f"OpenAI call failed ({e}), retry {attempt}/{max_retries} in {delay:.1f}s.")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        counters["success"] += 1
+        return result
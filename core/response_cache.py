@@ -0,0 +1,117 @@
+import collections, hashlib, logging, threading, time, unicodedata
+from core.storage import connect_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_input(text):
+    """Case-folds, strips diacritics and collapses whitespace: 'Één  Huis' -> 'een huis'."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(folded.split())
+
+
+class ResponseCache:
+    """
+    Persistent cache of model answers, keyed by (kind, normalized input,
+    prompt version, model). Entries expire after ttl seconds, and the least
+    recently used ones are evicted above max_entries.
+
+    Given a shared `store`, answers are also written there and local misses
+    are looked up in it, so one bot process's answers serve all of them.
+    """
+
+    def __init__(self, path, ttl, max_entries, store=None):
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        with self.lock:
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache (accessed);
+                """
+            )
+            self.size = self.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    @staticmethod
+    def key(kind, text, prompt_version, model):
+        raw = f"{kind}\0{prompt_version}\0{model}\0{normalize_input(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, kind, text, prompt_version, model):
+        key = self.key(kind, text, prompt_version, model)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self.size -= 1
+                row = None
+            if row is not None:
+                self.conn.execute("UPDATE response_cache SET accessed = ? WHERE key = ?", (now, key))
+                self.hits[kind] += 1
+                return row[0]
+
+        shared = await self.store.get(f"response:{key}") if self.store else None
+        if shared is None:
+            with self.lock:
+                self.misses[kind] += 1
+            return None
+        with self.lock:
+            self.hits[kind] += 1
+        response = shared.decode("utf-8")
+        self._put_local(key, kind, response, now)
+        return response
+
+    async def put(self, kind, text, prompt_version, model, response):
+        key = self.key(kind, text, prompt_version, model)
+        if self.store:
+            await self.store.set(f"response:{key}", response, ttl=self.ttl)
+        self._put_local(key, kind, response, time.time())
+
+    def _put_local(self, key, kind, response, now):
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO response_cache (key, kind, response, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, response, now, now),
+            )
+            if cursor.rowcount:
+                self.size += 1
+            else:
+                self.conn.execute(
+                    "UPDATE response_cache SET response = ?, created = ?, accessed = ? WHERE key = ?",
+                    (response, now, now, key),
+                )
+            if self.size > self.max_entries:
+                self._evict(now)
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM response_cache WHERE created < ?", (now - self.ttl,))
+        excess = self.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+        self.size = self.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def metrics(self):
+        return {"size": self.size, "hits": dict(self.hits), "misses": dict(self.misses)}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,26 @@
+from telegram import Update
+from telegram.ext import ContextTypes, MessageHandler, filters
+from core.metrics import traced
+
+
+class ModeRouter:
+    """
+    Sends each free-text message to the checker registered for the user's
+    current mode (context.user_data['mode']), so one message runs one checker.
+    """
+
+    def __init__(self):
+        self.checkers = {}  # mode -> async (update, context) callback
+
+    def register(self, mode, checker):
+        self.checkers[mode] = traced(f"{mode}_check", checker)
+
+    def get_message_handler(self):
+        # Blocking, so the update processor keeps the check in order with the user's other updates;
+        # other users' updates run concurrently all the same.
+        return MessageHandler(filters.TEXT & ~filters.COMMAND, self.route)
+
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        checker = self.checkers.get(context.user_data.get('mode'))
+        if checker:
+            await checker(update, context)
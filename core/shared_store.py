@@ -0,0 +1,295 @@
+import asyncio, contextlib, logging, threading, time, uuid
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+class LocalValues:
+    """The values of a LocalStore, behind plain blocking methods."""
+
+    def __init__(self):
+        self.values = {}  # key -> (value, expires at or None)
+        self.lists = {}  # key -> (list, set)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.values.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.time():
+                del self.values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        """Returns False when only_if_missing is set and the key exists."""
+        with self.lock:
+            item = self.values.get(key)
+            if only_if_missing and item and (item[1] is None or item[1] > time.time()):
+                return False
+            self.values[key] = (_encode(value), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key, only_if_value=None):
+        """Returns whether the key was deleted."""
+        with self.lock:
+            item = self.values.get(key)
+            if not item or (item[1] is not None and item[1] <= time.time()):
+                return False
+            if only_if_value is not None and item[0] != _encode(only_if_value):
+                return False
+            del self.values[key]
+            return True
+
+    def refresh(self, key, value, ttl):
+        """Gives key a new ttl if it still holds value; returns whether it did."""
+        with self.lock:
+            item = self.values.get(key)
+            if not item or item[0] != _encode(value) or (item[1] is not None and item[1] <= time.time()):
+                return False
+            self.values[key] = (item[0], time.time() + ttl)
+            return True
+
+    def append_unique(self, key, value):
+        """Appends value to the list at key unless it is already in it; returns whether it was added."""
+        value = _encode(value)
+        with self.lock:
+            items, seen = self.lists.setdefault(key, ([], set()))
+            if value in seen:
+                return False
+            items.append(value)
+            seen.add(value)
+            return True
+
+    def members(self, key):
+        with self.lock:
+            items, _ = self.lists.get(key, ([], set()))
+            return list(items)
+
+    def close(self):
+        pass
+
+
+class LocalStore:
+    """
+    Process-local store (the default): state shared between the components of
+    one bot process only. Values are bytes; str values are stored UTF-8 encoded.
+
+    The methods are coroutines, so code on the event loop never waits on a
+    RedisStore's network round trip. `sync` has the same methods as plain
+    blocking calls, for code that runs in worker threads (sentence history).
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.sync = LocalValues()
+
+    async def get(self, key):
+        return self.sync.get(key)
+
+    async def set(self, key, value, ttl=None, only_if_missing=False):
+        """Returns False when only_if_missing is set and the key exists."""
+        return self.sync.set(key, value, ttl, only_if_missing)
+
+    async def delete(self, key, only_if_value=None):
+        """Returns whether the key was deleted."""
+        return self.sync.delete(key, only_if_value)
+
+    async def refresh(self, key, value, ttl):
+        """Gives key a new ttl if it still holds value; returns whether it did."""
+        return self.sync.refresh(key, value, ttl)
+
+    async def append_unique(self, key, value):
+        """Appends value to the list at key unless it is already in it; returns whether it was added."""
+        return self.sync.append_unique(key, value)
+
+    async def members(self, key):
+        return self.sync.members(key)
+
+    async def close(self):
+        self.sync.close()
+
+    @contextlib.asynccontextmanager
+    async def lock_key(self, name, ttl=120, poll_interval=0.05):
+        """
+        Holds the lock `name` for the duration of the block. The lock expires
+        after ttl seconds in case its holder dies without releasing it; while
+        the block runs, its ttl is renewed every third of that, so a block may
+        take longer than ttl.
+        """
+        token = uuid.uuid4().hex
+        key = f"lock:{name}"
+        while not await self.set(key, token, ttl=ttl, only_if_missing=True):
+            await asyncio.sleep(poll_interval)
+        renewal = asyncio.create_task(self._renew(key, token, ttl))
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            if not await self.delete(key, only_if_value=token):
+                logger.error(f"Lock {name} had expired before its release; another holder may have run meanwhile.")
+
+    async def _renew(self, key, token, ttl):
+        while True:
+            await asyncio.sleep(ttl / 3)
+            try:
+                if not await self.refresh(key, token, ttl):
+                    logger.error(f"Lost {key} while holding it.")
+                    return
+            except Exception as e:
+                logger.warning(f"Could not renew {key}: {e}")
+
+
+class RedisValues:
+    """Blocking access to a RedisStore's values through a redis.Redis client, for worker threads."""
+
+    def __init__(self, client, namespace):
+        self.client = client
+        self.namespace = namespace
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        return self.client.get(self._key(key))
+
+    def set(self, key, value, ttl=None, only_if_missing=False):
+        return bool(self.client.set(self._key(key), value, px=int(ttl * 1000) if ttl else None, nx=only_if_missing))
+
+    def delete(self, key, only_if_value=None):
+        key = self._key(key)
+        if only_if_value is None:
+            return bool(self.client.delete(key))
+        import redis
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != _encode(only_if_value):
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                return bool(pipe.execute()[0])
+            except redis.WatchError:
+                return False
+
+    def refresh(self, key, value, ttl):
+        key = self._key(key)
+        import redis
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != _encode(value):
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.pexpire(key, int(ttl * 1000))
+                return bool(pipe.execute()[0])
+            except redis.WatchError:
+                return False
+
+    def append_unique(self, key, value):
+        key = self._key(key)
+        if not self.client.sadd(key + ":set", value):
+            return False
+        self.client.rpush(key, value)
+        return True
+
+    def members(self, key):
+        return self.client.lrange(self._key(key), 0, -1)
+
+    def close(self):
+        self.client.close()
+
+
+class RedisStore(LocalStore):
+    """
+    The same store on a Redis server (or anything speaking its protocol), so
+    several bot processes, on one machine or many, see the same state. Keys
+    are prefixed with `namespace`. `client` is a redis.asyncio.Redis and
+    `sync_client` a redis.Redis for `sync`, both on the same server, or their
+    fakeredis counterparts in tests.
+    """
+
+    shared = True
+
+    def __init__(self, client, sync_client, namespace="dutchbot"):
+        self.client = client
+        self.namespace = namespace
+        self.sync = RedisValues(sync_client, namespace)
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key):
+        return await self.client.get(self._key(key))
+
+    async def set(self, key, value, ttl=None, only_if_missing=False):
+        return bool(await self.client.set(self._key(key), value, px=int(ttl * 1000) if ttl else None, nx=only_if_missing))
+
+    async def delete(self, key, only_if_value=None):
+        key = self._key(key)
+        if only_if_value is None:
+            return bool(await self.client.delete(key))
+        import redis
+        # Compare-and-delete, so an expired lock taken over by another process is not released
+        async with self.client.pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) != _encode(only_if_value):
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                return bool((await pipe.execute())[0])
+            except redis.WatchError:
+                return False
+
+    async def refresh(self, key, value, ttl):
+        key = self._key(key)
+        import redis
+        # Compare-and-expire, like delete()
+        async with self.client.pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) != _encode(value):
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                pipe.pexpire(key, int(ttl * 1000))
+                return bool((await pipe.execute())[0])
+            except redis.WatchError:
+                return False
+
+    async def append_unique(self, key, value):
+        key = self._key(key)
+        if not await self.client.sadd(key + ":set", value):
+            return False
+        await self.client.rpush(key, value)
+        return True
+
+    async def members(self, key):
+        return await self.client.lrange(self._key(key), 0, -1)
+
+    async def close(self):
+        await self.client.aclose()
+        self.sync.close()
+
+
+def create_shared_store(url):
+    """LocalStore for an empty url, RedisStore for redis:// (rediss://, unix://) urls."""
+    if not url or url == "local":
+        return LocalStore()
+    try:
+        import redis, redis.asyncio
+    except ImportError:
+        raise RuntimeError("SHARED_STORE_URL needs the redis package: pip install redis")
+    store = RedisStore(redis.asyncio.Redis.from_url(url), redis.Redis.from_url(url))
+    logger.info(f"Sharing state through {url.split('@')[-1]}.")
+    return store
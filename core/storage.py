@@ -0,0 +1,182 @@
+import datetime, json, os, sqlite3, threading, logging
+
+logger = logging.getLogger(__name__)
+
+
+def connect_sqlite(path):
+    """Opens a long-lived SQLite connection in WAL mode, shared by all handlers."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStorage:
+    """Sentence history stored as append-only rows indexed by (mode, date)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sentences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    mode TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    sentence TEXT NOT NULL,
+                    UNIQUE (mode, date, sentence)
+                );
+                CREATE INDEX IF NOT EXISTS idx_sentences_mode_date ON sentences (mode, date);
+                """
+            )
+
+    def add(self, mode, date, sentence):
+        self.add_many([(mode, date, sentence)])
+
+    def add_many(self, rows):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO sentences (mode, date, sentence) VALUES (?, ?, ?)",
+                    rows,
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def range(self, mode, since):
+        """Returns the sentences of a mode stored on or after the ISO date `since`."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT sentence FROM sentences WHERE mode = ? AND date >= ? ORDER BY date, id",
+                (mode, since),
+            )
+            return [row[0] for row in cursor]
+
+    def range_by_date(self, mode, since):
+        """Like range(), but keeps the date: returns a list of (date, sentence)."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT date, sentence FROM sentences WHERE mode = ? AND date >= ? ORDER BY date, id",
+                (mode, since),
+            )
+            return cursor.fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class JSONStorage:
+    """Legacy backend: the whole history in one JSON file, rewritten on every change."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+
+    def load(self):
+        if os.path.exists(self.filepath):
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"dictate": {}, "translation": {}}
+
+    def save(self, memory):
+        with open(self.filepath, "w", encoding="utf-8") as f:
+            json.dump(memory, f, ensure_ascii=False, indent=2)
+
+    def add(self, mode, date, sentence):
+        self.add_many([(mode, date, sentence)])
+
+    def add_many(self, rows):
+        with self.lock:
+            memory = self.load()
+            for mode, date, sentence in rows:
+                memory.setdefault(mode, {}).setdefault(date, [])
+                if sentence not in memory[mode][date]:
+                    memory[mode][date].append(sentence)
+            self.save(memory)
+
+    def range(self, mode, since):
+        return [sentence for _, sentence in self.range_by_date(mode, since)]
+
+    def range_by_date(self, mode, since):
+        with self.lock:
+            memory = self.load()
+        result = []
+        for date_str, sentences in sorted(memory.get(mode, {}).items()):
+            if date_str >= since:
+                result.extend((date_str, sentence) for sentence in sentences)
+        return result
+
+    def iter_rows(self):
+        for mode, dates in self.load().items():
+            for date_str, sentences in dates.items():
+                for sentence in sentences:
+                    yield mode, date_str, sentence
+
+    def close(self):
+        pass
+
+
+class SharedStoreStorage:
+    """
+    Sentence history in a shared store (see core/shared_store.py): one list
+    per mode and date. Like the other backends it blocks, through the
+    store's `sync` methods, so it is meant to be called from worker threads.
+    """
+
+    def __init__(self, store):
+        self.store = store.sync
+
+    def add(self, mode, date, sentence):
+        self.store.append_unique(f"sentences:{mode}:{date}", sentence)
+
+    def add_many(self, rows):
+        for mode, date, sentence in rows:
+            self.add(mode, date, sentence)
+
+    def range(self, mode, since):
+        return [sentence for _, sentence in self.range_by_date(mode, since)]
+
+    def range_by_date(self, mode, since):
+        result = []
+        day = datetime.date.fromisoformat(since)
+        while day <= datetime.date.today():
+            date_str = str(day)
+            result.extend((date_str, s.decode("utf-8")) for s in self.store.members(f"sentences:{mode}:{date_str}"))
+            day += datetime.timedelta(days=1)
+        return result
+
+    def close(self):
+        pass
+
+
+def migrate_json_to_sqlite(json_path, storage):
+    """
+    One-shot migration of a legacy memory.json into the SQLite backend.
+    The JSON file is renamed to *.migrated afterwards so it is never imported twice.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    rows = list(JSONStorage(json_path).iter_rows())
+    storage.add_many(rows)
+    os.replace(json_path, json_path + ".migrated")
+    logger.info(f"Migrated {len(rows)} sentences from {json_path} to {storage.path}.")
+    return len(rows)
+
+
+def create_storage(backend, json_path, db_path, store=None):
+    if backend == "shared":
+        return SharedStoreStorage(store)
+    if backend == "json":
+        return JSONStorage(json_path)
+    if backend == "sqlite":
+        storage = SQLiteStorage(db_path)
+        migrate_json_to_sqlite(json_path, storage)
+        return storage
+    raise ValueError(f"Unknown memory backend: {backend}")
@@ -0,0 +1,56 @@
+import logging, time
+from telegram.error import BadRequest, RetryAfter
+from config import STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def reply_formatted(message, text, parse_mode="Markdown"):
+    """Replies with text in parse_mode, or as plain text if Telegram refuses the formatting."""
+    try:
+        return await message.reply_text(text, parse_mode=parse_mode, disable_web_page_preview=True)
+    except BadRequest as e:
+        logger.warning(f"Reply with {parse_mode} failed, sending plain text: {e}")
+        return await message.reply_text(text, disable_web_page_preview=True)
+
+
+async def stream_reply(message, chunks, prefix="", parse_mode="Markdown", edit_interval=STREAM_EDIT_INTERVAL):
+    """
+    Replies with a placeholder and edits it with the text received so far,
+    at most once per edit_interval seconds. Partial text is sent without
+    formatting (half-received Markdown would be rejected); the final edit
+    applies parse_mode, falling back to plain text if Telegram refuses it.
+    Returns the complete text.
+    """
+    sent = await message.reply_text(prefix + "…")
+    text = ""
+    next_edit = time.monotonic() + edit_interval
+
+    async for delta in chunks:
+        text += delta
+        if time.monotonic() < next_edit or not text.strip():
+            continue
+        partial = (prefix + text.rstrip() + " …")[:MAX_MESSAGE_LENGTH]
+        try:
+            await sent.edit_text(partial)
+            next_edit = time.monotonic() + edit_interval
+        except RetryAfter as e:
+            # Flood control: skip edits until Telegram allows them again
+            next_edit = time.monotonic() + e.retry_after
+        except BadRequest as e:
+            logger.debug(f"Skipped partial edit: {e}")
+            next_edit = time.monotonic() + edit_interval
+
+    text = text.strip()
+    final = (prefix + text)[:MAX_MESSAGE_LENGTH]
+    try:
+        await sent.edit_text(final, parse_mode=parse_mode, disable_web_page_preview=True)
+    except BadRequest as e:
+        if not parse_mode:
+            raise
+        logger.warning(f"Final edit with {parse_mode} failed, sending plain text: {e}")
+        await sent.edit_text(final, disable_web_page_preview=True)
+    return text
@@ -0,0 +1,12 @@
+import asyncio
+
+
+async def gather_partial(**coros):
+    """
+    Runs independent coroutines concurrently and returns {name: result}.
+    A coroutine that fails has its exception as the result instead of
+    cancelling the others, so the caller decides which failures are fatal.
+    """
+    names = list(coros)
+    results = await asyncio.gather(*coros.values(), return_exceptions=True)
+    return dict(zip(names, results))
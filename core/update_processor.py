@@ -0,0 +1,121 @@
+import asyncio, contextlib, logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs the updates of different users concurrently, at most
+    `max_concurrent_updates` at a time, and the updates of one user strictly
+    one after another in arrival order, so an answer never races the
+    /dictate that set its exercise.
+
+    At most `max_pending` updates are admitted at once (running, or waiting
+    for a slot or for the same user's previous update). Beyond that,
+    admit() waits, which pauses polling through UpdateQueue, and the webhook
+    answers 503 so Telegram delivers the update again later.
+
+    With a shared `store` (several bot processes), a user's update also
+    holds the user's lock in the store, so no two processes handle the same
+    user at once, and `after_update` (which saves user_data) is awaited
+    before the lock is released, so the next process sees the new state.
+    """
+
+    def __init__(self, max_concurrent_updates, max_pending=256, store=None):
+        # The base class counts admitted updates; admission never exceeds max_pending, so
+        # updates enter do_process_update() in arrival order without waiting there.
+        super().__init__(max(max_pending, max_concurrent_updates, 2))
+        self.limit = max_concurrent_updates
+        self.max_pending = max_pending
+        self.slots = asyncio.Semaphore(max_concurrent_updates)
+        self.tails = {}  # user or chat id -> future done when its latest update is processed
+        self.admitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.capacity = asyncio.Event()
+        self.store = store if store is not None and store.shared else None
+        self.after_update = None  # async () -> None
+
+    @staticmethod
+    def _key(update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    @property
+    def saturated(self):
+        return self.admitted >= self.max_pending
+
+    async def admit(self):
+        """Waits until fewer than max_pending updates are admitted, then counts one more."""
+        while self.saturated:
+            self.capacity.clear()
+            await self.capacity.wait()
+        self.admitted += 1
+
+    def reject(self):
+        self.rejected += 1
+
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        previous = self.tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self.tails[key] = done
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            async with self.slots, self._user_lock(key):
+                self.running += 1
+                try:
+                    await coroutine
+                    if self.store and self.after_update:
+                        await self.after_update()
+                finally:
+                    self.running -= 1
+        finally:
+            done.set_result(None)
+            if key is not None and self.tails.get(key) is done:
+                del self.tails[key]
+            if isinstance(update, Update):
+                self.admitted -= 1
+                self.capacity.set()
+
+    def _user_lock(self, key):
+        if self.store is None or key is None:
+            return contextlib.nullcontext()
+        return self.store.lock_key(f"user:{key}")
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def metrics(self):
+        return {
+            "running": self.running,
+            "admitted": self.admitted,
+            "limit": self.limit,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+
+class UpdateQueue(asyncio.Queue):
+    """Application.update_queue that admits each update with the processor before queueing it."""
+
+    def __init__(self, processor):
+        super().__init__()
+        self.processor = processor
+
+    async def put(self, item):
+        if isinstance(item, Update):
+            await self.processor.admit()
+        await super().put(item)
@@ -0,0 +1,70 @@
+import hmac, logging
+from aiohttp import web
+from telegram import Update
+from core.metrics import handle_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WebhookServer:
+    """
+    aiohttp server that receives Telegram updates for an Application.
+
+    POST <path>  - an update from Telegram; rejected with 403 unless the
+                   X-Telegram-Bot-Api-Secret-Token header matches the secret,
+                   and with 503 while the update processor is saturated
+                   (Telegram then delivers it again later)
+    GET /healthz - the process is up
+    GET /readyz  - the Application is running and accepts updates
+    GET /metrics - Prometheus metrics
+    """
+
+    def __init__(self, application, secret, path="/telegram", host="0.0.0.0", port=8080, processor=None):
+        if not secret:
+            raise ValueError("WebhookServer needs a secret, or anyone who finds the path can post updates")
+        self.application = application
+        self.processor = processor
+        self.secret = secret
+        self.path = path
+        self.host = host
+        self.port = port
+        self.runner = None
+
+        self.web_app = web.Application()
+        self.web_app.router.add_post(path, self.handle_update)
+        self.web_app.router.add_get("/healthz", self.handle_health)
+        self.web_app.router.add_get("/readyz", self.handle_ready)
+        self.web_app.router.add_get("/metrics", handle_metrics)
+
+    async def handle_update(self, request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if self.processor and self.processor.saturated:
+            self.processor.reject()
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request):
+        return web.Response(text="ok")
+
+    async def handle_ready(self, request):
+        if self.application.running:
+            return web.Response(text="ready")
+        return web.Response(status=503, text="starting")
+
+    async def start(self):
+        self.runner = web.AppRunner(self.web_app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
@@ -0,0 +1,101 @@
+import bisect, collections, logging, os, random, threading
+from core.utils import load_words_from_csv
+
+logger = logging.getLogger(__name__)
+
+
+class WordBank:
+    """
+    The frequency word list, loaded once and kept in memory.
+
+    Words are stored in a tuple in file order, plus a lowercased sorted copy for
+    prefix lookups and a word -> position index. The file covers frequency ranks
+    2000-5000, so a word's rank is rank_offset + its position (approximate, since
+    the file is not strictly ordered by frequency). Sampling picks random indices,
+    so it does not depend on the size of the list.
+    """
+
+    def __init__(self, path, rank_offset=2000, recent_size=0):
+        self.path = path
+        self.rank_offset = rank_offset  # rank of the first word in the file
+        self.recent_size = recent_size  # words remembered per user (0 disables exclusion)
+        self.recent = {}  # user_id -> deque of recently practiced words
+        self.lock = threading.Lock()
+        self.words = ()
+        self.sorted_words = []
+        self.index = {}
+        self.mtime = None
+        self.reload()
+
+    def reload(self, path=None):
+        """Re-reads the CSV and swaps the new list in. Returns the number of words."""
+        path = path or self.path
+        words = tuple(dict.fromkeys(w.strip() for w in load_words_from_csv(path) if w.strip()))
+        sorted_words = sorted((w.lower(), w) for w in words)
+        index = {word: i for i, word in enumerate(words)}
+        with self.lock:
+            self.path = path
+            self.words, self.sorted_words, self.index = words, sorted_words, index
+            self.mtime = os.path.getmtime(path)
+        logger.info(f"Loaded {len(words)} words from {path}.")
+        return len(words)
+
+    def reload_if_changed(self):
+        if os.path.getmtime(self.path) != self.mtime:
+            return self.reload()
+        return None
+
+    async def reload_job(self, context=None):
+        """Job-queue callback: picks up an updated CSV without a restart."""
+        try:
+            self.reload_if_changed()
+        except Exception as e:
+            logger.error(f"Failed to reload word list: {e}")
+
+    def __len__(self):
+        return len(self.words)
+
+    def sample(self, k, user_id=None):
+        """Returns k distinct random words, skipping words the user practiced recently."""
+        words = self.words
+        excluded = set(self.recent.get(user_id, ())) if user_id is not None else set()
+        if len(words) - len(excluded) < k:
+            excluded = set()
+        if k * 2 > len(words) - len(excluded):
+            # Small list: rejection sampling would spin, sample from the remainder instead
+            return random.sample([w for w in words if w not in excluded], k)
+
+        chosen = []
+        while len(chosen) < k:
+            word = words[random.randrange(len(words))]
+            if word not in excluded and word not in chosen:
+                chosen.append(word)
+        return chosen
+
+    def mark_practiced(self, user_id, words):
+        if not self.recent_size:
+            return
+        with self.lock:
+            recent = self.recent.setdefault(user_id, collections.deque(maxlen=self.recent_size))
+            recent.extend(words)
+
+    def by_prefix(self, prefix, limit=20):
+        prefix = prefix.lower()
+        sorted_words = self.sorted_words
+        start = bisect.bisect_left(sorted_words, (prefix, ""))
+        result = []
+        for key, word in sorted_words[start:]:
+            if not key.startswith(prefix) or len(result) >= limit:
+                break
+            result.append(word)
+        return result
+
+    def by_rank(self, start, stop):
+        """Words whose frequency rank is in [start, stop)."""
+        lo = max(start - self.rank_offset, 0)
+        hi = max(stop - self.rank_offset, 0)
+        return list(self.words[lo:hi])
+
+    def rank(self, word):
+        i = self.index.get(word)
+        return None if i is None else i + self.rank_offset
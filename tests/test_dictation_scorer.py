@@ -0,0 +1,45 @@
+import pytest
+
+from core.dictation_scorer import compare_tokens, score_dictation
+
+
+@pytest.mark.parametrize("expected, actual, error", [
+    ("huis", "huis", None),
+    ("Huis", "huis", None),
+    ("één", "een", 'diacritics'),
+    ("café", "cafe", 'diacritics'),
+    ("huis", "huys", 'spelling'),
+    ("school", "skool", 'spelling'),
+    ("vandaag", "vandag", 'spelling'),
+    ("wachten", "wacht", 'grammar'),
+    ("wacht", "wachten", 'grammar'),
+    ("gebeurd", "gebeurt", 'grammar'),
+    ("werkte", "werkten", 'grammar'),
+    ("mooi", "mooie", 'grammar'),
+    # Short words: one letter more makes another word, not a typo
+    ("op", "om", 'wrong'),
+    ("is", "in", 'wrong'),
+    ("dat", "wat", 'wrong'),
+    ("een", "en", 'wrong'),
+    ("de", "het", 'wrong'),
+    ("groot", "klein", 'wrong'),
+])
+def test_compare_tokens(expected, actual, error):
+    assert compare_tokens(expected, actual) == error
+
+
+def test_short_word_substitution_is_not_minor():
+    result = score_dictation("Ik wacht op de bus.", "Ik wacht om de bus.")
+    assert result.errors == [('wrong', 'op', 'om')]
+    assert not result.minor
+
+
+def test_misspelling_is_minor():
+    result = score_dictation("Het huis is groot en mooi vandaag.", "Het huys is groot en mooi vandaag")
+    assert result.minor
+    assert result.score >= 9
+
+
+def test_swapped_words_are_word_order():
+    result = score_dictation("Ik ga morgen naar huis.", "Ik ga naar huis morgen.")
+    assert [error for error, _, _ in result.errors] == ['order']
@@ -0,0 +1,98 @@
+import asyncio, os, types
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from core.openai_client import OpenAIClient
+from core.rate_limit import FairScheduler
+
+
+class SlowCompletions:
+    """Stands in for client.chat.completions: every call takes `seconds`."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.models = []
+
+    async def create(self, model, messages, **kwargs):
+        self.models.append(model)
+        await asyncio.sleep(self.seconds)
+        message = types.SimpleNamespace(content="antwoord")
+        return types.SimpleNamespace(model=model, usage=None, choices=[types.SimpleNamespace(message=message)])
+
+
+def make_client(seconds, limit=1):
+    client = OpenAIClient(audio_cache=None, scheduler=FairScheduler(limit))
+    client.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=SlowCompletions(seconds)))
+    return client
+
+
+def test_waiting_for_a_slot_is_not_an_upstream_failure():
+    async def check():
+        client = make_client(0.1)
+        messages = [{"role": "user", "content": "hallo"}]
+        # Each call takes 0.1 s upstream, well within its deadline, but the
+        # last ones wait 0.2-0.3 s for the single slot
+        responses = await asyncio.gather(*(
+            client.chat_completion(messages, model="gpt-4o", deadline=0.2) for _ in range(4)
+        ))
+        assert [r.model for r in responses] == ["gpt-4o"] * 4
+        assert client.breakers["gpt-4o"].state == "closed"
+        assert client.outcomes == {"success": 4}
+        await client.http_client.aclose()
+
+    asyncio.run(check())
+
+
+def test_slow_upstream_still_times_out():
+    async def check():
+        client = make_client(0.3)
+        with pytest.raises(asyncio.TimeoutError):
+            await client._call(
+                lambda model: client.client.chat.completions.create(model, []), "gpt-4o", 0.05, fallback=False
+            )
+        assert client.outcomes["timeout"] >= 1
+        await client.http_client.aclose()
+
+    asyncio.run(check())
+
+
+class FakeStream:
+    def __init__(self, model, text):
+        self.chunks = [
+            types.SimpleNamespace(model=model, usage=None, choices=[
+                types.SimpleNamespace(delta=types.SimpleNamespace(content=word + " "))
+            ])
+            for word in text.split()
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class StreamCompletions:
+    async def create(self, model, messages, stream, **kwargs):
+        return FakeStream(model, "een antwoord")
+
+
+@pytest.mark.parametrize("primary_down", [False, True])
+def test_stream_reports_the_model_that_answered(primary_down):
+    async def check():
+        client = make_client(0)
+        client.client.chat.completions = StreamCompletions()
+        if primary_down:
+            client.breakers["gpt-4o"].opened_at = float("inf")
+        answer = client.stream_chat_completion([{"role": "user", "content": "hallo"}], model="gpt-4o")
+        text = "".join([piece async for piece in answer])
+        assert text == "een antwoord "
+        assert answer.degraded == primary_down
+        await client.http_client.aclose()
+
+    asyncio.run(check())
@@ -0,0 +1,190 @@
+import asyncio, datetime
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from core.audio_cache import AudioCache
+from core.persistence import StorePersistence
+from core.response_cache import ResponseCache
+from core.shared_store import LocalStore, RedisStore
+from core.storage import SharedStoreStorage
+
+
+def redis_store(server):
+    """A RedisStore as one bot process sees it; stores on the same server share their state."""
+    return RedisStore(fakeredis.FakeAsyncRedis(server=server), fakeredis.FakeRedis(server=server))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.mark.parametrize("kind", ["local", "redis"])
+def test_values(kind, server):
+    async def check():
+        store = LocalStore() if kind == "local" else redis_store(server)
+        assert await store.get("a") is None
+        assert await store.set("a", "1")
+        assert await store.get("a") == b"1"
+        assert not await store.set("a", "2", only_if_missing=True)
+        await store.delete("a", only_if_value="2")
+        assert await store.get("a") == b"1"
+        await store.delete("a", only_if_value="1")
+        assert await store.get("a") is None
+
+        await store.set("b", "1", ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert await store.get("b") is None
+
+        assert await store.append_unique("list", "x")
+        assert not await store.append_unique("list", "x")
+        assert store.sync.append_unique("list", "y")
+        assert await store.members("list") == [b"x", b"y"]
+        assert store.sync.members("list") == [b"x", b"y"]
+        await store.close()
+
+    run(check())
+
+
+def test_processes_share_values(server):
+    async def check():
+        one, two = redis_store(server), redis_store(server)
+        await one.set("key", "value")
+        assert await two.get("key") == b"value"
+        assert await two.get("other") is None
+        await one.close()
+        await two.close()
+
+    run(check())
+
+
+def test_lock_key_excludes_other_processes(server):
+    async def check():
+        one, two = redis_store(server), redis_store(server)
+        events = []
+
+        async def hold(store, name):
+            async with store.lock_key("user:1", poll_interval=0.01):
+                events.append(f"{name} in")
+                await asyncio.sleep(0.05)
+                events.append(f"{name} out")
+
+        await asyncio.gather(hold(one, "one"), hold(two, "two"))
+        assert events in (["one in", "one out", "two in", "two out"], ["two in", "two out", "one in", "one out"])
+        assert await one.get("lock:user:1") is None
+        await one.close()
+        await two.close()
+
+    run(check())
+
+
+def test_persistence_follows_user_across_processes(server):
+    async def check():
+        one, two = StorePersistence(redis_store(server)), StorePersistence(redis_store(server))
+        await one.update_user_data(1, {"mode": "dictate"})
+        data = {}
+        await two.refresh_user_data(1, data)
+        assert data == {"mode": "dictate"}
+
+        data["mode"] = "reading"
+        await two.update_user_data(1, data)
+        seen = {"mode": "dictate"}
+        await one.refresh_user_data(1, seen)
+        assert seen == {"mode": "reading"}
+
+        await one.drop_user_data(1)
+        gone = {}
+        await two.refresh_user_data(1, gone)
+        assert gone == {}
+
+    run(check())
+
+
+def test_sentence_history_in_worker_thread(server):
+    async def check():
+        storage = SharedStoreStorage(redis_store(server))
+        today = str(datetime.date.today())
+        await asyncio.to_thread(storage.add_many, [("dictate", today, "Ik wacht."), ("dictate", today, "Ik wacht.")])
+        since = str(datetime.date.today() - datetime.timedelta(days=2))
+        assert await asyncio.to_thread(storage.range, "dictate", since) == ["Ik wacht."]
+
+    run(check())
+
+
+def test_caches_share_answers_and_file_ids(server, tmp_path):
+    async def check():
+        one = ResponseCache(str(tmp_path / "one.db"), ttl=60, max_entries=10, store=redis_store(server))
+        two = ResponseCache(str(tmp_path / "two.db"), ttl=60, max_entries=10, store=redis_store(server))
+        await one.put("word", "huis", 1, "model", "house")
+        assert await two.get("word", "Huis", 1, "model") == "house"
+        one.close()
+        two.close()
+
+        audio = AudioCache(str(tmp_path / "audio"), 0, store=redis_store(server))
+        other = AudioCache(str(tmp_path / "audio"), 0, store=redis_store(server))
+        await audio.set_file_id("a.mp3", "FILE")
+        assert await other.get_file_id("a.mp3") == "FILE"
+        await other.set_file_id("a.mp3", None)
+        assert await audio.get_file_id("a.mp3") is None
+        audio.close()
+        other.close()
+
+    run(check())
+
+
+def test_lock_is_renewed_while_held(server):
+    async def check():
+        one, two = redis_store(server), redis_store(server)
+        events = []
+
+        async def hold(store, name, seconds):
+            async with store.lock_key("user:1", ttl=0.15, poll_interval=0.01):
+                events.append(f"{name} in")
+                await asyncio.sleep(seconds)
+                events.append(f"{name} out")
+
+        first = asyncio.create_task(hold(one, "one", 0.5))
+        await asyncio.sleep(0.05)
+        await hold(two, "two", 0)
+        await first
+        assert events == ["one in", "one out", "two in", "two out"]
+        await one.close()
+        await two.close()
+
+    run(check())
+
+
+def test_releasing_an_expired_lock_is_reported(caplog):
+    async def check():
+        store = LocalStore()
+        store._renew = lambda key, token, ttl: asyncio.sleep(0)  # no renewal
+        async with store.lock_key("user:1", ttl=0.05):
+            await asyncio.sleep(0.1)
+            assert await store.set("lock:user:1", "other", only_if_missing=True)
+        assert await store.get("lock:user:1") == b"other"
+
+    run(check())
+    assert "had expired before its release" in caplog.text
+
+
+def test_persistence_stores_json_and_never_unpickles(server):
+    import pickle
+
+    async def check():
+        store = redis_store(server)
+        persistence = StorePersistence(store)
+        await persistence.update_user_data(1, {"mode": "dictate", "dictation_text": "Ik wacht."})
+        assert (await store.get("user_data:1")).startswith(b"{")
+
+        await store.set("user_data:2", pickle.dumps(("v", {"mode": "word"})))
+        data = {}
+        await StorePersistence(store).refresh_user_data(2, data)
+        assert data == {}
+        await store.close()
+
+    run(check())
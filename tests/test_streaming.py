@@ -0,0 +1,42 @@
+import asyncio
+
+from telegram.error import BadRequest
+
+from core.streaming import reply_formatted, stream_reply
+
+
+class StubMessage:
+    """Records what was sent; rejects Markdown like Telegram does for unbalanced entities."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def reply_text(self, text, parse_mode=None, **kwargs):
+        if parse_mode and text.count("*") % 2:
+            raise BadRequest("Can't parse entities")
+        self.sent.append((text, parse_mode))
+        return self
+
+    async def edit_text(self, text, parse_mode=None, **kwargs):
+        return await self.reply_text(text, parse_mode, **kwargs)
+
+
+async def pieces(text):
+    for word in text.split(" "):
+        yield word + " "
+
+
+def test_rejected_markdown_is_sent_plain_from_the_stream_and_the_cache():
+    async def check():
+        message = StubMessage()
+        text = await stream_reply(message, pieces("*huis* het huis, 2 * 3"), edit_interval=0)
+        assert message.sent[-1] == (text, None)
+
+        cached = StubMessage()
+        await reply_formatted(cached, text)
+        assert cached.sent == [(text, None)]
+
+        await reply_formatted(cached, "*huis*: house")
+        assert cached.sent[-1] == ("*huis*: house", "Markdown")
+
+    asyncio.run(check())